@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 from logging.config import fileConfig
 from sqlalchemy import create_engine, pool
@@ -26,11 +27,18 @@ if config.config_file_name is not None:
 # Metadata for autogenerate
 target_metadata = Base.metadata
 
+# Monthly partitions (see app.partitions) are managed outside the models.
+PARTITION = re.compile(r"_(p\d{6}|default)$")
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and reflected and compare_to is None and PARTITION.search(name))
+
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -40,7 +48,7 @@ def run_migrations_offline() -> None:
 def run_migrations_online() -> None:
     connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
         with context.begin_transaction():
             context.run_migrations()
 
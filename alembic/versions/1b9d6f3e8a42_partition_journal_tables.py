@@ -0,0 +1,110 @@
+"""Partition journal tables by month
+
+Revision ID: 1b9d6f3e8a42
+Revises: 8c41e7d2b9f5
+Create Date: 2026-10-17 14:40:08.731654
+
+Postgres only: `transactions` and `journal_entries` are rebuilt as tables
+range-partitioned by month (see `app.partitions`), with a partition per
+month from the oldest row to three months ahead plus a default partition.
+Every row is copied, so expect this to take a while on a large journal.
+Primary keys become (id, timestamp) and (id, created_at), since a
+partitioned table's unique constraints must include the partition key;
+for the same reason journal_entries.transaction_id can no longer be a
+foreign key. On SQLite this migration does nothing.
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b9d6f3e8a42'
+down_revision: Union[str, Sequence[str], None] = '8c41e7d2b9f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+# table -> (partition key, indexes as (name, definition))
+TABLES = {
+    'transactions': ('timestamp', [
+        ('ix_transactions_id', '(id)'),
+        ('ix_transactions_account_timestamp_id', '(account_id, timestamp, id)'),
+    ]),
+    'journal_entries': ('created_at', [
+        ('ix_journal_entries_account_created_id', '(account_id, created_at, id)'),
+        ('ix_journal_entries_transaction_id', '(transaction_id)'),
+        ('ix_journal_entries_created_at', 'USING brin (created_at)'),
+    ]),
+}
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rebuild(table: str, partitioned: bool) -> None:
+    """Recreate `table` (partitioned or not) with the same columns and copy its rows over."""
+    connection = op.get_bind()
+    key, indexes = TABLES[table]
+    sequence = connection.execute(sa.text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+    old = f"{table}_old"
+    for name, _ in indexes:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+
+    if partitioned:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ({key})")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {key})")
+        oldest = connection.execute(sa.text(f"SELECT min({key}) FROM {old}")).scalar()
+        month = (oldest or datetime.utcnow()).date().replace(day=1)
+        last = _add_months(datetime.utcnow().date().replace(day=1), MONTHS_AHEAD)
+        while month <= last:
+            following = _add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+            month = following
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_account_id_fkey "
+               "FOREIGN KEY (account_id) REFERENCES accounts (id)")
+    for name, definition in indexes:
+        op.execute(f"CREATE INDEX {name} ON {table} {definition}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("ALTER TABLE journal_entries DROP CONSTRAINT IF EXISTS journal_entries_transaction_id_fkey")
+    _rebuild('transactions', partitioned=True)
+    _rebuild('journal_entries', partitioned=True)
+    op.execute("DROP TABLE journal_entries_old")
+    op.execute("DROP TABLE transactions_old")
+    op.execute("ANALYZE transactions")
+    op.execute("ANALYZE journal_entries")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _rebuild('transactions', partitioned=False)
+    _rebuild('journal_entries', partitioned=False)
+    op.execute("DROP TABLE journal_entries_old")
+    op.execute("DROP TABLE transactions_old")
+    op.execute("ALTER TABLE journal_entries ADD CONSTRAINT journal_entries_transaction_id_fkey "
+               "FOREIGN KEY (transaction_id) REFERENCES transactions (id)")
@@ -0,0 +1,46 @@
+"""Balance snapshots and job checkpoints
+
+Revision ID: 5e02b9d4c718
+Revises: c3d8f1a27b45
+Create Date: 2026-10-16 16:40:09.731552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e02b9d4c718'
+down_revision: Union[str, Sequence[str], None] = 'c3d8f1a27b45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'balance_snapshots',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('balance_minor', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.PrimaryKeyConstraint('account_id', 'day')
+    )
+    op.create_table(
+        'job_checkpoints',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index('ix_journal_entries_created_at', 'journal_entries', ['created_at'], unique=False,
+                    postgresql_using='brin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_journal_entries_created_at', table_name='journal_entries')
+    op.drop_table('job_checkpoints')
+    op.drop_table('balance_snapshots')
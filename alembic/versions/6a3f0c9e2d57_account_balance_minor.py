@@ -0,0 +1,36 @@
+"""Account balance in minor units
+
+Revision ID: 6a3f0c9e2d57
+Revises: 1b9d6f3e8a42
+Create Date: 2026-10-16 10:12:44.905112
+
+accounts.balance (float) becomes accounts.balance_minor (integer cents),
+like the journal, so balance updates are exact and cannot drift from it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3f0c9e2d57'
+down_revision: Union[str, Sequence[str], None] = '1b9d6f3e8a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('accounts', sa.Column('balance_minor', sa.BigInteger(), server_default='0', nullable=False))
+    op.execute("UPDATE accounts SET balance_minor = CAST(ROUND(COALESCE(balance, 0) * 100) AS BIGINT)")
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.drop_column('balance')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('accounts', sa.Column('balance', sa.Float(), nullable=True))
+    op.execute("UPDATE accounts SET balance = balance_minor / 100.0")
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.drop_column('balance_minor')
@@ -0,0 +1,79 @@
+"""Account shards
+
+Revision ID: 8c41e7d2b9f5
+Revises: f2c7a5d83e16
+Create Date: 2026-10-17 09:12:31.508217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e7d2b9f5'
+down_revision: Union[str, Sequence[str], None] = 'f2c7a5d83e16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('accounts', sa.Column('shards', sa.Integer(), server_default='0', nullable=False))
+    op.create_table(
+        'account_shards',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('balance_minor', sa.BigInteger(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('account_id', 'shard')
+    )
+    op.create_index(op.f('ix_account_shards_user_id'), 'account_shards', ['user_id'], unique=False)
+
+    # Existing aggregate rows become shard 0 of their (account, month, kind).
+    with op.batch_alter_table('monthly_aggregates', recreate='always') as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.Integer(), server_default='0', nullable=False))
+        if op.get_bind().dialect.name != "sqlite":  # SQLite's primary key has no name; the rebuild replaces it
+            batch_op.drop_constraint('monthly_aggregates_pkey', type_='primary')
+        batch_op.create_primary_key('monthly_aggregates_pkey', ['account_id', 'month', 'kind', 'shard'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Fold shard rows back into one row per (account, month, kind).
+    op.execute(
+        "UPDATE monthly_aggregates SET "
+        "tx_count = (SELECT SUM(s.tx_count) FROM monthly_aggregates s WHERE s.account_id = monthly_aggregates.account_id "
+        "AND s.month = monthly_aggregates.month AND s.kind = monthly_aggregates.kind), "
+        "total_minor = (SELECT SUM(s.total_minor) FROM monthly_aggregates s WHERE s.account_id = monthly_aggregates.account_id "
+        "AND s.month = monthly_aggregates.month AND s.kind = monthly_aggregates.kind) "
+        "WHERE shard = 0"
+    )
+    op.execute(
+        "INSERT INTO monthly_aggregates (account_id, month, kind, shard, tx_count, total_minor) "
+        "SELECT account_id, month, kind, 0, SUM(tx_count), SUM(total_minor) FROM monthly_aggregates s "
+        "GROUP BY account_id, month, kind HAVING MIN(shard) > 0"
+    )
+    op.execute("DELETE FROM monthly_aggregates WHERE shard > 0")
+    with op.batch_alter_table('monthly_aggregates', recreate='always') as batch_op:
+        if op.get_bind().dialect.name != "sqlite":
+            batch_op.drop_constraint('monthly_aggregates_pkey', type_='primary')
+        batch_op.create_primary_key('monthly_aggregates_pkey', ['account_id', 'month', 'kind'])
+        batch_op.drop_column('shard')
+
+    # Shard balances move back into their accounts before the shards go.
+    op.execute(
+        "UPDATE accounts SET balance = balance + (SELECT SUM(balance_minor) FROM account_shards s "
+        "WHERE s.account_id = accounts.id) / 100.0 WHERE id IN (SELECT account_id FROM account_shards)"
+    )
+    op.execute(
+        "UPDATE users SET data_version = data_version + (SELECT SUM(version) FROM account_shards s "
+        "WHERE s.user_id = users.id) WHERE id IN (SELECT user_id FROM account_shards)"
+    )
+    op.drop_index(op.f('ix_account_shards_user_id'), table_name='account_shards')
+    op.drop_table('account_shards')
+    op.drop_column('accounts', 'shards')
@@ -0,0 +1,48 @@
+"""Monthly aggregates
+
+Revision ID: 9b6e4d2f0a31
+Revises: 5e02b9d4c718
+Create Date: 2026-10-16 18:22:50.064311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b6e4d2f0a31'
+down_revision: Union[str, Sequence[str], None] = '5e02b9d4c718'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'monthly_aggregates',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('tx_count', sa.BigInteger(), nullable=False),
+        sa.Column('total_minor', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.PrimaryKeyConstraint('account_id', 'month', 'kind')
+    )
+
+    # Backfill from the journal (same query as `python -m app.aggregates`).
+    if op.get_bind().dialect.name == "sqlite":
+        month = "date(created_at, 'start of month')"
+    else:
+        month = "CAST(date_trunc('month', created_at) AS DATE)"
+    op.execute(
+        "INSERT INTO monthly_aggregates (account_id, month, kind, tx_count, total_minor) "
+        f"SELECT account_id, {month}, kind, COUNT(*), SUM(ABS(amount_minor)) FROM journal_entries "
+        f"WHERE account_id IS NOT NULL GROUP BY account_id, {month}, kind"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('monthly_aggregates')
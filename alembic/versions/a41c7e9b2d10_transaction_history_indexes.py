@@ -0,0 +1,36 @@
+"""Transaction history indexes
+
+Revision ID: a41c7e9b2d10
+Revises: 53270f678d2d
+Create Date: 2026-10-16 09:12:41.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e9b2d10'
+down_revision: Union[str, Sequence[str], None] = '53270f678d2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_accounts_user_id'), 'accounts', ['user_id'], unique=False)
+    op.create_index('ix_transactions_timestamp_id', 'transactions', ['timestamp', 'id'], unique=False)
+    op.create_index('ix_transactions_account_timestamp_id', 'transactions', ['account_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_transactions_account_type_timestamp_id', 'transactions', ['account_id', 'type', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_transactions_account_amount', 'transactions', ['account_id', 'amount'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_account_amount', table_name='transactions')
+    op.drop_index('ix_transactions_account_type_timestamp_id', table_name='transactions')
+    op.drop_index('ix_transactions_account_timestamp_id', table_name='transactions')
+    op.drop_index('ix_transactions_timestamp_id', table_name='transactions')
+    op.drop_index(op.f('ix_accounts_user_id'), table_name='accounts')
@@ -0,0 +1,89 @@
+"""Double-entry journal
+
+Revision ID: c3d8f1a27b45
+Revises: a41c7e9b2d10
+Create Date: 2026-10-16 14:03:27.518220
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8f1a27b45'
+down_revision: Union[str, Sequence[str], None] = 'a41c7e9b2d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'journal_entries',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('amount_minor', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Each existing deposit/withdrawal becomes an account leg plus the
+    # opposite leg against the outside world.
+    signed = "CASE WHEN type = 'deposit' THEN 1 ELSE -1 END * CAST(ROUND(amount * 100) AS BIGINT)"
+    for account_column, sign in (("account_id", ""), ("NULL", "-")):
+        op.execute(
+            "INSERT INTO journal_entries (transaction_id, account_id, kind, amount_minor, created_at) "
+            f"SELECT id, {account_column}, type, {sign}({signed}), timestamp FROM transactions "
+            "WHERE type IN ('deposit', 'withdraw') ORDER BY timestamp, id"
+        )
+
+    # Transfers and starting balances were never journaled, so post whatever
+    # the journal cannot explain as an opening adjustment per account.
+    connection = op.get_bind()
+    gaps = connection.execute(sa.text(
+        "SELECT a.id, CAST(ROUND(a.balance * 100) AS BIGINT) - COALESCE(SUM(e.amount_minor), 0) AS gap "
+        "FROM accounts a LEFT JOIN journal_entries e ON e.account_id = a.id "
+        "GROUP BY a.id, a.balance"
+    )).all()
+    now = datetime.utcnow()
+    for account_id, gap in gaps:
+        if not gap:
+            continue
+        transaction_id = connection.execute(sa.text(
+            "INSERT INTO transactions (account_id, type, amount, timestamp) "
+            "VALUES (:account_id, 'opening', :amount, :now) RETURNING id"
+        ), {"account_id": account_id, "amount": abs(gap) / 100, "now": now}).scalar()
+        connection.execute(sa.text(
+            "INSERT INTO journal_entries (transaction_id, account_id, kind, amount_minor, created_at) "
+            "VALUES (:transaction_id, :account_id, 'opening', :amount, :now)"
+        ), [
+            {"transaction_id": transaction_id, "account_id": account_id, "amount": gap, "now": now},
+            {"transaction_id": transaction_id, "account_id": None, "amount": -gap, "now": now},
+        ])
+
+    op.create_index('ix_journal_entries_account_created_id', 'journal_entries', ['account_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_journal_entries_transaction_id', 'journal_entries', ['transaction_id'], unique=False)
+
+    # History no longer reads the transactions table; drop the indexes that
+    # only served it so appends stay cheap.
+    op.drop_index('ix_transactions_account_amount', table_name='transactions')
+    op.drop_index('ix_transactions_account_type_timestamp_id', table_name='transactions')
+    op.drop_index('ix_transactions_timestamp_id', table_name='transactions')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_transactions_timestamp_id', 'transactions', ['timestamp', 'id'], unique=False)
+    op.create_index('ix_transactions_account_type_timestamp_id', 'transactions', ['account_id', 'type', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_transactions_account_amount', 'transactions', ['account_id', 'amount'], unique=False)
+    op.drop_index('ix_journal_entries_transaction_id', table_name='journal_entries')
+    op.drop_index('ix_journal_entries_account_created_id', table_name='journal_entries')
+    op.drop_table('journal_entries')
+    op.execute("DELETE FROM transactions WHERE type IN ('transfer', 'opening')")
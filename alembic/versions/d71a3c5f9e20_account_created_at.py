@@ -0,0 +1,29 @@
+"""Account creation time
+
+Revision ID: d71a3c5f9e20
+Revises: 9b6e4d2f0a31
+Create Date: 2026-10-16 20:05:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd71a3c5f9e20'
+down_revision: Union[str, Sequence[str], None] = '9b6e4d2f0a31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing accounts keep NULL: opened before this column existed.
+    op.add_column('accounts', sa.Column('created_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('accounts', 'created_at')
@@ -0,0 +1,28 @@
+"""User data version
+
+Revision ID: f2c7a5d83e16
+Revises: e4b09c61a7d3
+Create Date: 2026-10-16 23:58:40.217390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7a5d83e16'
+down_revision: Union[str, Sequence[str], None] = 'e4b09c61a7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'data_version')
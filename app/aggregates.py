@@ -0,0 +1,112 @@
+"""
+Monthly journal aggregates behind the summary endpoints.
+
+`monthly_aggregates` holds one row per (account, month, entry kind) with the
+number of entries and their unsigned total (and, for hot accounts, one such
+row per balance shard written to; readers sum them). `add_entries` is called by
+`crud.post_journal` for every write, upserting the affected rows in the
+same database transaction, so summaries are always consistent with the
+journal and are served without scanning it.
+
+To backfill existing data, or after restoring the journal, rebuild the
+table from the journal (rows of archived months are kept as they are):
+
+    python -m app.aggregates
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import Date, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import archive, models
+from .database import SessionLocal
+
+
+def month_of(moment: datetime) -> date:
+    """First day of the month containing `moment`."""
+    return moment.date().replace(day=1)
+
+
+def _upsert(db: Session):
+    table = models.MonthlyAggregate.__table__
+    insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.account_id, table.c.month, table.c.kind, table.c.shard],
+        set_={
+            "tx_count": table.c.tx_count + stmt.excluded.tx_count,
+            "total_minor": table.c.total_minor + stmt.excluded.total_minor,
+        },
+    )
+
+
+def add_entries(db: Session, entries: list[dict], shard: int = 0):
+    """
+    Fold new journal entries into their monthly aggregate rows (without committing).
+
+    Args:
+        db (Session): Database session, in the transaction writing the entries.
+        entries (list[dict]): Rows as inserted into journal_entries.
+        shard (int): Aggregate shard to add to; a hot account's shard writes
+            use their own, so they do not queue on one aggregate row.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for entry in entries:
+        if entry["account_id"] is None:
+            continue
+        key = (entry["account_id"], month_of(entry["created_at"]), entry["kind"])
+        totals[key][0] += 1
+        totals[key][1] += abs(entry["amount_minor"])
+    if totals:
+        # Sorted, so concurrent writers lock aggregate rows in the same order.
+        db.execute(_upsert(db), [
+            {"account_id": account_id, "month": month, "kind": kind, "shard": shard,
+             "tx_count": count, "total_minor": total}
+            for (account_id, month, kind), (count, total) in sorted(totals.items())
+        ])
+
+
+def _month_expression(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column, "start of month")
+    return cast(func.date_trunc("month", column), Date)
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recompute every aggregate row from the journal in one transaction.
+
+    Months already archived (see `archive`) are no longer in the journal,
+    so their rows are left alone.
+
+    Returns:
+        int: Number of aggregate rows written.
+    """
+    e = models.JournalEntry
+    table = models.MonthlyAggregate.__table__
+    month = _month_expression(db, e.created_at)
+    grouped = (
+        select(e.account_id, month, e.kind, func.count(), func.sum(func.abs(e.amount_minor)))
+        .where(e.account_id.is_not(None))
+        .group_by(e.account_id, month, e.kind)
+    )
+    archived_before = archive.boundary()
+    db.execute(delete(table).where(table.c.month >= archived_before) if archived_before else delete(table))
+    db.execute(table.insert().from_select(["account_id", "month", "kind", "tx_count", "total_minor"], grouped))
+    db.commit()
+    return db.execute(select(func.count()).select_from(table)).scalar()
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    with SessionLocal() as db:
+        print({"aggregates": rebuild(db)})
+
+
+if __name__ == "__main__":
+    main()
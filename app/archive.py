@@ -0,0 +1,248 @@
+"""
+Read access to archived journal months.
+
+`python -m app.partitions` moves months past the retention window out of
+the database into ARCHIVE_DIR: one directory per month (``2024-01/``)
+holding a manifest and one NumPy ``.npy`` file per column of
+`journal_entries` and `transactions`. Journal entries are stored sorted by
+(account, created_at, id), with the entry kind dictionary-encoded and the
+outside world's NULL account as -1; timestamps are datetime64[us].
+
+Columns are memory-mapped on first use, so a lookup only pages in what it
+touches: a binary search on the account column finds an account's
+entries for the month. History (`crud.get_transactions`), statements,
+balance-as-of, reconciliation and the aggregates rebuild read through
+here for months no longer in the database. Every archived month is older
+than every row left in the database, so archived rows always sort before
+live ones.
+
+Configuration (environment):
+    ARCHIVE_DIR  where archived months live (default ./archive); every host
+                 serving the API needs the same files (e.g. a shared mount).
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import date, datetime
+from typing import NamedTuple
+
+import numpy as np
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+MONTH_NAME = re.compile(r"^\d{4}-\d{2}$")
+JOURNAL = "journal_entries"
+HEADERS = "transactions"
+
+
+class Entry(NamedTuple):
+    """An archived journal entry, shaped like a `journal_entries` row."""
+    id: int
+    transaction_id: int
+    account_id: int | None
+    kind: str
+    amount_minor: int
+    created_at: datetime
+
+
+def next_month(month: date) -> date:
+    """First day of the month after `month` (itself a first day)."""
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _bound(value: datetime) -> np.datetime64:
+    return np.datetime64(value, "us")
+
+
+class ArchivedMonth:
+    """
+    One archived month; columns are memory-mapped when first read.
+
+    Args:
+        path (str): The month's directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as manifest:
+            self.manifest = json.load(manifest)
+        self.start = date.fromisoformat(self.manifest["month"] + "-01")
+        self.end = next_month(self.start)
+        self.first = datetime.combine(self.start, datetime.min.time())
+        self.stop = datetime.combine(self.end, datetime.min.time())
+        self.kinds = self.manifest["kinds"]
+        self._columns = {}
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        """A column of `table` for this month, memory-mapped read-only."""
+        found = self._columns.get((table, name))
+        if found is None:
+            found = np.load(os.path.join(self.path, f"{table}.{name}.npy"), mmap_mode="r")
+            self._columns[(table, name)] = found
+        return found
+
+    def overlaps(self, start: datetime | None, end: datetime | None) -> bool:
+        """Whether [start, end) can contain entries of this month."""
+        return (start is None or start < self.stop) and (end is None or end > self.first)
+
+    def account_slices(self, account_ids: list[int] | None) -> list[slice]:
+        """Positions of the given accounts' entries (None: every account, not the outside world)."""
+        accounts = self.column(JOURNAL, "account_id")
+        if account_ids is None:
+            return [slice(int(np.searchsorted(accounts, 0)), len(accounts))]
+        wanted = np.unique(np.asarray(account_ids, dtype=accounts.dtype))
+        lows = np.searchsorted(accounts, wanted, "left")
+        highs = np.searchsorted(accounts, wanted, "right")
+        return [slice(int(lo), int(hi)) for lo, hi in zip(lows, highs) if hi > lo]
+
+
+_lock = threading.Lock()
+_scanned: dict = {"key": None, "months": {}}
+
+
+def months(directory: str | None = None) -> list[ArchivedMonth]:
+    """
+    Archived months, oldest first.
+
+    The directory listing is cached until the directory changes (a month
+    being sealed renames into it), so this is one stat() per call.
+    """
+    directory = directory or ARCHIVE_DIR
+    try:
+        key = (directory, os.stat(directory).st_mtime_ns)
+    except FileNotFoundError:
+        return []
+    with _lock:
+        if _scanned["key"] != key:
+            known = _scanned["months"] if _scanned["key"] and _scanned["key"][0] == directory else {}
+            names = sorted(name for name in os.listdir(directory) if MONTH_NAME.match(name))
+            _scanned["months"] = {
+                name: known.get(name) or ArchivedMonth(os.path.join(directory, name)) for name in names
+            }
+            _scanned["key"] = key
+        return list(_scanned["months"].values())
+
+
+def iter_entries(
+    account_ids: list[int] | None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    kind: str | None = None,
+    min_minor: int | None = None,
+    max_minor: int | None = None,
+    after: tuple[datetime, int] | None = None,
+    before: tuple[datetime, int] | None = None,
+    newest_first: bool = False,
+    directory: str | None = None,
+):
+    """
+    Yield archived entries of some accounts in (created_at, id) order, one month's list at a time.
+
+    Args:
+        account_ids (list[int] | None): Accounts to read; None for all accounts.
+        start (datetime | None): Inclusive lower bound on created_at.
+        end (datetime | None): Exclusive upper bound on created_at.
+        kind (str | None): Only entries of this kind.
+        min_minor (int | None): Inclusive lower bound on the unsigned amount.
+        max_minor (int | None): Inclusive upper bound on the unsigned amount.
+        after (tuple[datetime, int] | None): Only entries before this (created_at, id) position.
+        before (tuple[datetime, int] | None): Only entries after this position.
+        newest_first (bool): Walk months and entries newest first.
+
+    Yields:
+        list[Entry]: A month's matching entries.
+    """
+    archived = months(directory)
+    for month in reversed(archived) if newest_first else archived:
+        if not month.overlaps(start, end) or (after and after[0] < month.first) \
+                or (before and before[0] >= month.stop) or (kind is not None and kind not in month.kinds):
+            continue
+        slices = month.account_slices(account_ids)
+        if not slices:
+            continue
+
+        def take(name):
+            column = month.column(JOURNAL, name)
+            return np.concatenate([column[s] for s in slices])
+
+        created, ids = take("created_at"), take("id")
+        keep = np.ones(len(ids), dtype=bool)
+        if start is not None:
+            keep &= created >= _bound(start)
+        if end is not None:
+            keep &= created < _bound(end)
+        if after is not None:
+            at = _bound(after[0])
+            keep &= (created < at) | ((created == at) & (ids < after[1]))
+        if before is not None:
+            at = _bound(before[0])
+            keep &= (created > at) | ((created == at) & (ids > before[1]))
+        amounts, kinds = take("amount_minor"), take("kind")
+        if kind is not None:
+            keep &= kinds == month.kinds.index(kind)
+        if min_minor is not None:
+            keep &= np.abs(amounts) >= min_minor
+        if max_minor is not None:
+            keep &= np.abs(amounts) <= max_minor
+        if not keep.any():
+            continue
+
+        order = np.lexsort((ids[keep], created[keep]))
+        if newest_first:
+            order = order[::-1]
+        columns = (ids[keep][order], take("transaction_id")[keep][order], take("account_id")[keep][order],
+                   kinds[keep][order], amounts[keep][order], created[keep][order])
+        yield [
+            Entry(entry_id, transaction_id, account_id if account_id >= 0 else None, month.kinds[code], amount,
+                  moment)
+            for entry_id, transaction_id, account_id, code, amount, moment in zip(
+                *(column.tolist() for column in columns)
+            )
+        ]
+
+
+def sums(first: int, last: int, start: datetime | None = None, end: datetime | None = None,
+         directory: str | None = None) -> dict[int, int]:
+    """
+    Net archived amount (minor units) per account, for accounts with first <= id < last.
+
+    Args:
+        first (int): Lowest account id.
+        last (int): One past the highest account id.
+        start (datetime | None): Inclusive lower bound on created_at.
+        end (datetime | None): Exclusive upper bound on created_at.
+
+    Returns:
+        dict[int, int]: Accounts with archived entries in range and their sums.
+    """
+    totals: dict[int, int] = {}
+    for month in months(directory):
+        if not month.overlaps(start, end):
+            continue
+        accounts = month.column(JOURNAL, "account_id")
+        lo, hi = np.searchsorted(accounts, [first, last])
+        if hi <= lo:
+            continue
+        ids, amounts = accounts[lo:hi], month.column(JOURNAL, "amount_minor")[lo:hi]
+        if start is not None or end is not None:
+            created = month.column(JOURNAL, "created_at")[lo:hi]
+            keep = np.ones(len(ids), dtype=bool)
+            if start is not None:
+                keep &= created >= _bound(start)
+            if end is not None:
+                keep &= created < _bound(end)
+            ids, amounts = ids[keep], amounts[keep]
+            if not len(ids):
+                continue
+        # ids are sorted, so each account's entries are one run.
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        for account_id, total in zip(ids[starts].tolist(), np.add.reduceat(amounts, starts).tolist()):
+            totals[account_id] = totals.get(account_id, 0) + total
+    return totals
+
+
+def boundary(directory: str | None = None) -> date | None:
+    """First day after the newest archived month, or None if nothing is archived."""
+    archived = months(directory)
+    return archived[-1].end if archived else None
@@ -0,0 +1,157 @@
+"""
+In-process caches for lookups repeated on every authenticated request.
+
+- ``principals``: bearer token -> user ID, so a token is only decoded and
+  verified once per TTL (never past its own expiry). A token revoked
+  while cached keeps working until its entry expires.
+- ``account_owners``: account ID -> owning user ID.
+- ``hot_accounts``: account ID -> number of balance shards (0 for an
+  ordinary account; see `shards`).
+- ``user_profiles``: user ID -> public profile served by /auth/me.
+- ``idempotent_results``: (user ID, Idempotency-Key) -> stored request
+  fingerprint and result (see `idempotency`).
+- ``recent_writers``: user ID -> 1 for READ_STICKY_SECONDS after the user
+  wrote, while their reads go to the primary (see
+  `database.open_read_session`).
+
+Each cache is a TTL-bounded LRU. With CACHE_BACKEND=shm the integer
+caches live in a shared-memory table (see `shm`) so all uvicorn workers on
+a host share one copy; profiles and idempotent results always stay
+per-process. Writers call the
+``invalidate_*`` helpers after committing. Hit/miss counts are exported on
+/metrics.
+
+Configuration (environment):
+    CACHE_BACKEND        memory (default) or shm.
+    CACHE_TTL_SECONDS    entry lifetime (default 60).
+    CACHE_MAX_ENTRIES    per-cache size bound for the memory backend (default 10000).
+    CACHE_SHM_SLOTS      slots in the shared table (default 65536).
+    LITEBANK_SHM_NAME    prefix for shared-memory segment names (default litebank).
+    READ_STICKY_SECONDS  how long a user's reads stay on the primary after a
+                         write (default 5); keep it above the replica's lag.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .shm import SharedSlotTable, stable_key
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_SHM_SLOTS = int(os.getenv("CACHE_SHM_SLOTS", "65536"))
+SHM_NAME = os.getenv("LITEBANK_SHM_NAME", "litebank")
+READ_STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", "5"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Args:
+        name (str): Name used in metrics.
+        maxsize (int): Maximum entries; the least recently used is evicted.
+        ttl (float): Default entry lifetime in seconds.
+    """
+
+    def __init__(self, name: str, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float | None = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedIntCache:
+    """
+    TTLCache-compatible cache of integer values in a shared-memory table.
+
+    Entries of every SharedIntCache share one table, separated by a
+    namespace mixed into the key. Hit/miss counters are per process.
+    """
+
+    def __init__(self, name: str, table: SharedSlotTable, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.table = table
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        found = self.table.get(stable_key(self.name, key))
+        if found is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return int(found[0])
+
+    def set(self, key, value: int, ttl: float | None = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self.table.put(stable_key(self.name, key), float(value), 0.0, expires)
+
+    def delete(self, key):
+        self.table.delete(stable_key(self.name, key))
+
+
+if CACHE_BACKEND == "shm":
+    _table = SharedSlotTable(f"{SHM_NAME}_cache", CACHE_SHM_SLOTS)
+    principals = SharedIntCache("principals", _table)
+    account_owners = SharedIntCache("account_owners", _table)
+    hot_accounts = SharedIntCache("hot_accounts", _table)
+    recent_writers = SharedIntCache("recent_writers", _table, ttl=READ_STICKY_SECONDS)
+else:
+    principals = TTLCache("principals")
+    account_owners = TTLCache("account_owners")
+    hot_accounts = TTLCache("hot_accounts")
+    recent_writers = TTLCache("recent_writers", ttl=READ_STICKY_SECONDS)
+user_profiles = TTLCache("user_profiles")
+idempotent_results = TTLCache("idempotent_results")
+
+CACHES = (principals, account_owners, hot_accounts, user_profiles, idempotent_results, recent_writers)
+
+
+def invalidate_user(user_id: int):
+    """Drop cached data derived from a user row."""
+    user_profiles.delete(user_id)
+
+
+def invalidate_account(account_id: int):
+    """Drop cached data derived from an account row."""
+    account_owners.delete(account_id)
+    hot_accounts.delete(account_id)
@@ -2,39 +2,96 @@
 Database CRUD operations for Users, Accounts, and Transactions.
 """
 
-from passlib.context import CryptContext
+import base64
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain, islice
+
+from sqlalchemy import bindparam, func, insert, select, tuple_, update
 from sqlalchemy.orm import Session
-from . import models, schemas
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from . import archive, models, schemas
+from .aggregates import add_entries
+from .cache import account_owners, hot_accounts, invalidate_user, user_profiles
+from .hashing import hash_password, pwd_context
+from .idempotency import Claim, record
+from .metrics import observe_bcrypt
+from .velocity import tracker as velocity
+
+# Balances and journal amounts are stored as integers in 1/MINOR_UNITS of the currency.
+MINOR_UNITS = models.MINOR_UNITS
+MAX_MINOR = 2 ** 63 - 1  # largest BigInteger
 
 def get_password_hash(password: str):
     """Hash a plaintext password."""
-    return pwd_context.hash(password[:72])
+    started = time.perf_counter()
+    try:
+        return hash_password(password)
+    finally:
+        observe_bcrypt("hash", time.perf_counter() - started)
 
 def verify_password(plain_password, hashed_password):
     """Verify a plaintext password against a hashed password."""
-    return pwd_context.verify(plain_password, hashed_password)
+    started = time.perf_counter()
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    finally:
+        observe_bcrypt("verify", time.perf_counter() - started)
 
 
-def create_user(db: Session, user: schemas.UserCreate):
+def create_user(db: Session, user: schemas.UserCreate, password_hash: str | None = None):
     """
     Create and persist a new user.
 
     Args:
         db (Session): Database session.
         user (schemas.UserCreate): Pydantic model with user details.
+        password_hash (str | None): Precomputed hash of user.password, if the
+            caller already hashed it (e.g. in the hashing pool).
 
     Returns:
         models.User: The created user instance.
     """
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = password_hash or get_password_hash(user.password)
     db_user = models.User(name=user.name, email=user.email, password_hash=hashed_pw)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(db_user.id)
     return db_user
 
+def get_user(db: Session, user_id: int):
+    """Retrieve a user by ID, or None."""
+    return db.get(models.User, user_id)
+
+def get_user_profile(db: Session, user_id: int):
+    """
+    Return a user's public profile (id, name, email), served from cache when possible.
+
+    Returns:
+        dict | None: The profile, or None if the user does not exist.
+    """
+    profile = user_profiles.get(user_id)
+    if profile is None:
+        user = get_user(db, user_id)
+        if user is None:
+            return None
+        profile = {"id": user.id, "name": user.name, "email": user.email}
+        user_profiles.set(user_id, profile)
+    return profile
+
+def get_user_by_email(db: Session, email: str):
+    """Retrieve a user by email (indexed lookup), or None."""
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def update_password_hash(db: Session, user_id: int, password_hash: str):
+    """Replace a user's stored password hash, e.g. after a cost upgrade."""
+    db.execute(update(models.User).where(models.User.id == user_id).values(password_hash=password_hash))
+    db.commit()
+    invalidate_user(user_id)
+
 def authenticate_user(db: Session, email: str, password: str):
     """
     Authenticate a user by email and password.
@@ -47,7 +104,7 @@ def authenticate_user(db: Session, email: str, password: str):
     Returns:
         models.User | None: The authenticated user or None if authentication fails.
     """
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = get_user_by_email(db, email)
     if not user:
         return None
     if not verify_password(password, user.password_hash):
@@ -77,13 +134,23 @@ def create_account(db: Session, account: schemas.AccountCreate):
         db (Session): Database session.
         account (schemas.AccountCreate): Account creation schema.
 
+    A non-zero starting balance is journaled as an opening entry.
+
+    Raises:
+        ValueError: If the balance is not a whole number of cents.
+
     Returns:
         models.Account: The created account instance.
     """
-    db_account = models.Account(user_id=account.user_id, balance=account.balance)
+    opening = to_minor(account.balance)
+    db_account = models.Account(user_id=account.user_id, balance_minor=opening)
     db.add(db_account)
+    db.flush()
+    if opening:
+        post_journal(db, [_posting(db_account.id, "opening", opening, datetime.utcnow())])
+    touch_users(db, [db_account.user_id])
     db.commit()
-    db.refresh(db_account)
+    account_owners.set(db_account.id, db_account.user_id)
     return db_account
 
 
@@ -91,76 +158,846 @@ def get_accounts(db: Session,  user_id: int | None = None):
     """
     Retrieve all accounts or filter by user.
 
+    Only the response columns are selected, as plain dicts in
+    `schemas.Account` field order, so list endpoints can serialize them
+    without hydrating ORM instances. A hot account's balance includes its
+    shards.
+
     Args:
         db (Session): Database session.
         user_id (int | None): Optional user ID to filter accounts.
 
     Returns:
-        list[models.Account]: List of accounts.
+        list[dict]: ``balance``, ``id`` and ``user_id`` of each account.
     """
-    query = db.query(models.Account)
+    a, s = models.Account, models.AccountShard
+    stmt = select(a.balance_minor, a.id, a.user_id).order_by(a.id)
+    shard_totals = select(s.account_id, func.sum(s.balance_minor)).group_by(s.account_id)
     if user_id:
-        query = query.filter(models.Account.user_id == user_id)
-    return query.all()
+        stmt = stmt.where(a.user_id == user_id)
+        shard_totals = shard_totals.where(s.user_id == user_id)
+    rows = db.execute(stmt).all()
+    in_shards = dict(db.execute(shard_totals).all())
+    return [
+        {"balance": (balance_minor + in_shards.get(account_id, 0)) / MINOR_UNITS, "id": account_id,
+         "user_id": owner}
+        for balance_minor, account_id, owner in rows
+    ]
+
+
+def get_account_owner(db: Session, account_id: int):
+    """Return the ID of the user owning an account, or None if it does not exist."""
+    owner = account_owners.get(account_id)
+    if owner is None:
+        owner = db.execute(
+            select(models.Account.user_id).where(models.Account.id == account_id)
+        ).scalar()
+        if owner is not None:
+            account_owners.set(account_id, owner)
+    return owner
+
+
+def statement_query(account_id: int, start: datetime | None = None, end: datetime | None = None):
+    """
+    Build the column-only, oldest-first select behind an account statement.
 
+    Args:
+        account_id (int): Account to report on.
+        start (datetime | None): Inclusive lower bound on the timestamp.
+        end (datetime | None): Exclusive upper bound on the timestamp.
 
-def create_transaction(db: Session, transaction: schemas.TransactionCreate):
+    Returns:
+        Select: Journal rows of (transaction id, timestamp, kind, signed amount in minor units).
+    """
+    e = models.JournalEntry
+    stmt = select(e.transaction_id, e.created_at, e.kind, e.amount_minor).where(e.account_id == account_id)
+    if start is not None:
+        stmt = stmt.where(e.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(e.created_at < end)
+    return stmt.order_by(e.created_at, e.id)
+
+
+def iter_statement(db: Session, account_id: int, start: datetime | None = None,
+                   end: datetime | None = None, batch_size: int = 1000):
+    """
+    Stream an account's journal entries in batches through a server-side cursor.
+
+    Archived months (see `archive`) come first, read from the archive.
+
+    Yields:
+        list[Row]: Up to batch_size rows, as described in `statement_query`.
+    """
+    yield from archived_statement(account_id, start, end, batch_size)
+    stmt = statement_query(account_id, start, end).execution_options(stream_results=True, yield_per=batch_size)
+    for partition in db.execute(stmt).partitions():
+        yield partition
+
+
+def archived_statement(account_id: int, start: datetime | None = None, end: datetime | None = None,
+                       batch_size: int = 1000):
+    """
+    The archived part of a statement, oldest first.
+
+    Yields:
+        list[tuple]: Up to batch_size rows shaped like `statement_query`'s.
+    """
+    for entries in archive.iter_entries([account_id], start, end):
+        rows = [(entry.transaction_id, entry.created_at, entry.kind, entry.amount_minor) for entry in entries]
+        for offset in range(0, len(rows), batch_size):
+            yield rows[offset:offset + batch_size]
+
+
+def create_transaction(db: Session, transaction: schemas.TransactionCreate, user_id: int | None = None,
+                       idempotency: Claim | None = None):
     """
     Create a transaction (deposit or withdraw) and update the account balance.
 
+    The balance change is a single conditional ``UPDATE ... RETURNING``, so
+    concurrent writers can never lose each other's updates and a withdrawal
+    can never overdraw the account. For a hot account it goes to one of its
+    balance shards instead (see `_shard_transaction`). Withdrawals are
+    checked against the account's velocity limits (see `velocity`) once
+    ownership is established.
+
     Args:
         db (Session): Database session.
         transaction (schemas.TransactionCreate): Transaction details.
+        user_id (int | None): If given, the account must belong to this user.
+        idempotency (Claim | None): Idempotency-Key claimed for this write;
+            the result is stored under it in the same database transaction.
 
     Raises:
-        ValueError: 
-            If account not found.
-            If withdrawal amount exceeds balance or transaction type is invalid.
+        PermissionError: If the account is not found or not owned by user_id.
+        ValueError: If withdrawal amount exceeds balance or a velocity
+            limit, the amount has fractions of a cent, or the transaction
+            type is invalid.
 
     Returns:
-        models.Transaction: The created transaction instance.
+        dict: The created transaction (id, account_id, type, amount, created_at).
     """
-    db_transaction = models.Transaction(
-        account_id=transaction.account_id,
-        type=transaction.type,
-        amount=transaction.amount
-    )
-    db.add(db_transaction)
+    _reject_cached_foreign(user_id, transaction.account_id)
+    minor = to_minor(transaction.amount)
+    shards = hot_accounts.get(transaction.account_id)
+    if shards:
+        result = _shard_transaction(db, transaction, minor, shards, user_id, idempotency)
+        if result is not None:
+            return result
+    account = models.Account
+    stmt = update(account).where(account.id == transaction.account_id)
+    if user_id is not None:
+        stmt = stmt.where(account.user_id == user_id)
 
-    account = db.query(models.Account).filter(models.Account.id == transaction.account_id).first()
-    if not account:
-        raise ValueError("Account not found")
+    if transaction.type == schemas.TransactionType.DEPOSIT:
+        stmt = stmt.values(balance_minor=account.balance_minor + minor)
+    elif transaction.type == schemas.TransactionType.WITHDRAW:
+        stmt = (
+            stmt.where(account.balance_minor >= minor)
+            .values(balance_minor=account.balance_minor - minor)
+        )
+    else:
+        raise ValueError("Invalid transaction type")
+
+    owner = db.execute(stmt.returning(account.user_id, account.shards)).first()
+    if owner is None:
+        db.rollback()
+        _raise_for_account(db, transaction.account_id, user_id)
+        if not shards:
+            # The account may have turned hot since it was cached, with the
+            # money in its shards rather than its row.
+            shards = db.execute(select(account.shards).where(account.id == transaction.account_id)).scalar()
+            db.rollback()
+            if shards:
+                hot_accounts.set(transaction.account_id, shards)
+                return create_transaction(db, transaction, user_id, idempotency)
+        raise ValueError("Insufficient funds")
+    if shards != owner.shards:
+        hot_accounts.set(transaction.account_id, owner.shards)
+    reservation = None
+    if transaction.type == schemas.TransactionType.WITHDRAW:
+        reservation = _check_velocity(db, transaction.account_id, minor)
+
+    try:
+        now = datetime.utcnow()
+        signed = minor if transaction.type == schemas.TransactionType.DEPOSIT else -minor
+        (transaction_id,) = post_journal(db, [_posting(transaction.account_id, transaction.type.value, signed, now)])
+        touch_users(db, [owner.user_id])
+        result = {
+            "id": transaction_id, "account_id": transaction.account_id, "type": transaction.type.value,
+            "amount": transaction.amount, "created_at": now,
+        }
+        if idempotency is not None:
+            record(db, idempotency, result)
+        db.commit()
+    except BaseException:
+        velocity.release(reservation)
+        raise
+    return result
+
+
+def _shard_transaction(db: Session, transaction: schemas.TransactionCreate, minor: int, shards: int,
+                       user_id: int | None, idempotency: Claim | None):
+    """
+    Apply a deposit or withdrawal to one balance shard of a hot account, and commit.
 
+    A deposit goes to a random shard. A withdrawal tries a random shard,
+    then the shard holding the most; if no single shard can cover it, all
+    shards are swept into the account row and `create_transaction`
+    withdraws from there. The owner's data version is bumped on the shard
+    row itself (see `get_data_version`), so no write here locks a row that
+    every writer shares.
+
+    Returns:
+        dict | None: The created transaction, or None to continue on the
+        account row (the transaction is then still open). That is also
+        the outcome for an account that is not (or no longer) hot or not
+        owned by user_id, which the account row path reports.
+    """
+    s = models.AccountShard
+    account_id = transaction.account_id
+    shard = random.randrange(shards)
+    owned = (s.account_id == account_id,) if user_id is None else (s.account_id == account_id, s.user_id == user_id)
+    changed = reservation = None
     if transaction.type == schemas.TransactionType.DEPOSIT:
-        account.balance += transaction.amount
+        changed = db.execute(
+            update(s).where(*owned, s.shard == shard)
+            .values(balance_minor=s.balance_minor + minor, version=s.version + 1)
+            .returning(s.shard)
+        ).scalar()
     elif transaction.type == schemas.TransactionType.WITHDRAW:
-        if account.balance >= transaction.amount:
-            account.balance -= transaction.amount
+        fullest = select(s.shard).where(*owned).order_by(s.balance_minor.desc()).limit(1).scalar_subquery()
+        for target in (shard, fullest):
+            changed = db.execute(
+                update(s).where(*owned, s.shard == target, s.balance_minor >= minor)
+                .values(balance_minor=s.balance_minor - minor, version=s.version + 1)
+                .returning(s.shard)
+            ).scalar()
+            if changed is not None:
+                reservation = _check_velocity(db, account_id, minor)
+                break
         else:
+            account = models.Account
+            locked = select(account.id).where(account.id == account_id)
+            if user_id is not None:
+                locked = locked.where(account.user_id == user_id)
+            if db.execute(locked.with_for_update()).first() is not None:
+                sweep_shards(db, [account_id])
+            return None
+    if changed is None:
+        return None
+
+    try:
+        now = datetime.utcnow()
+        signed = minor if transaction.type == schemas.TransactionType.DEPOSIT else -minor
+        (transaction_id,) = post_journal(db, [_posting(account_id, transaction.type.value, signed, now)],
+                                         shard=changed)
+        result = {
+            "id": transaction_id, "account_id": account_id, "type": transaction.type.value,
+            "amount": transaction.amount, "created_at": now,
+        }
+        if idempotency is not None:
+            record(db, idempotency, result)
+        db.commit()
+    except BaseException:
+        velocity.release(reservation)
+        raise
+    return result
+
+
+def sweep_shards(db: Session, account_ids) -> dict[int, int]:
+    """
+    Move hot accounts' shard balances into their account rows (without committing).
+
+    The caller must hold the account rows' locks; shard rows are locked
+    after them, in (account, shard) order, which is the order every writer
+    touching both uses.
+
+    Args:
+        db (Session): Database session.
+        account_ids: Accounts to sweep; ordinary accounts are skipped.
+
+    Returns:
+        dict[int, int]: Amount moved into each account row, in minor units.
+    """
+    s = models.AccountShard
+    rows = db.execute(
+        select(s.account_id, s.balance_minor)
+        .where(s.account_id.in_(list(account_ids)))
+        .order_by(s.account_id, s.shard)
+        .with_for_update()
+    ).all()
+    moved = defaultdict(int)
+    for account_id, balance_minor in rows:
+        moved[account_id] += balance_minor
+    moved = {account_id: total for account_id, total in moved.items() if total}
+    if moved:
+        db.execute(update(s).where(s.account_id.in_(list(moved))).values(balance_minor=0))
+        accounts = models.Account.__table__
+        db.execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam("_id"))
+            .values(balance_minor=accounts.c.balance_minor + bindparam("_delta")),
+            [{"_id": account_id, "_delta": delta} for account_id, delta in moved.items()],
+        )
+    return moved
+
+
+def transfer_funds(db: Session, transfer: schemas.TransferCreate, user_id: int | None = None,
+                   idempotency: Claim | None = None):
+    """
+    Move funds between two accounts in one database transaction.
+
+    Both account rows are locked in ascending id order before either balance
+    changes, so two opposing transfers cannot deadlock each other. A hot
+    account's shards are swept into its row first.
+
+    Args:
+        db (Session): Database session.
+        transfer (schemas.TransferCreate): Source, destination and amount.
+        user_id (int | None): If given, both accounts must belong to this user.
+        idempotency (Claim | None): Idempotency-Key claimed for this write;
+            the result is stored under it in the same database transaction.
+
+    Raises:
+        LookupError: If either account does not exist.
+        PermissionError: If either account is not owned by user_id.
+        ValueError: If the source account has insufficient funds, the
+            transfer exceeds its velocity limits, or both accounts are the same.
+
+    Returns:
+        tuple[float, float]: The new source and destination balances.
+    """
+    if transfer.from_account_id == transfer.to_account_id:
+        raise ValueError("Cannot transfer to the same account")
+    minor = to_minor(transfer.amount)
+    _reject_cached_foreign(user_id, transfer.from_account_id, transfer.to_account_id)
+
+    account = models.Account
+    ids = (transfer.from_account_id, transfer.to_account_id)
+    rows = db.execute(
+        select(account.id, account.user_id, account.shards)
+        .where(account.id.in_(ids))
+        .order_by(account.id)
+        .with_for_update()
+    ).all()
+    owners = {row.id: row.user_id for row in rows}
+    if len(owners) != len(ids):
+        db.rollback()
+        raise LookupError("One or both accounts not found")
+    if user_id is not None and any(owner != user_id for owner in owners.values()):
+        db.rollback()
+        raise PermissionError("Unauthorized transfer")
+    reservation = _check_velocity(db, transfer.from_account_id, minor)
+    try:
+        if any(row.shards for row in rows):
+            sweep_shards(db, [row.id for row in rows if row.shards])
+
+        debit = (
+            update(account)
+            .where(account.id == transfer.from_account_id, account.balance_minor >= minor)
+            .values(balance_minor=account.balance_minor - minor)
+            .returning(account.balance_minor)
+        )
+        from_minor = db.execute(debit).scalar()
+        if from_minor is None:
+            db.rollback()
             raise ValueError("Insufficient funds")
-    else:
-        raise ValueError("Invalid transaction type")
 
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+        credit = (
+            update(account)
+            .where(account.id == transfer.to_account_id)
+            .values(balance_minor=account.balance_minor + minor)
+            .returning(account.balance_minor)
+        )
+        from_balance, to_balance = from_minor / MINOR_UNITS, db.execute(credit).scalar() / MINOR_UNITS
+        post_journal(db, [_transfer_posting(transfer.from_account_id, transfer.to_account_id, minor,
+                                            datetime.utcnow())])
+        touch_users(db, owners.values())
+        if idempotency is not None:
+            record(db, idempotency, [from_balance, to_balance])
+        db.commit()
+    except BaseException:
+        velocity.release(reservation)
+        raise
+    return from_balance, to_balance
+
+
+def create_transactions_batch(
+    db: Session,
+    items: list[schemas.TransactionCreate],
+    user_id: int | None = None,
+    atomic: bool = True,
+    user_ids: list[int | None] | None = None,
+):
+    """
+    Apply many deposits/withdrawals in a single database transaction.
+
+    Ownership for every referenced account is checked with one locking
+    SELECT (hot accounts' shards are then swept into their rows), items are
+    validated in order against running balances and velocity limits, each
+    account's balance is updated once with its net change, and all
+    transaction rows are bulk-inserted.
+
+    Args:
+        db (Session): Database session.
+        items (list[schemas.TransactionCreate]): Items in the order to apply them.
+        user_id (int | None): If given, accounts must belong to this user.
+        atomic (bool): If True, apply nothing unless every item is valid.
+        user_ids (list[int | None] | None): Per-item owner to enforce instead
+            of user_id, for batches that mix callers (see `group_commit`).
 
-def get_transactions(db: Session, user_id: int | None = None):
+    Returns:
+        dict: ``committed``, ``succeeded``, ``failed`` and per-item ``results``.
+    """
+    account = models.Account
+    rows = db.execute(
+        select(account.id, account.user_id, account.balance_minor, account.shards)
+        .where(account.id.in_({item.account_id for item in items}))
+        .order_by(account.id)
+        .with_for_update()
+    ).all()
+    owners = {row.id: row.user_id for row in rows}
+    balances = {row.id: row.balance_minor for row in rows}
+    hot = {row.id: row.shards for row in rows if row.shards}
+    if hot:
+        for account_id, moved in sweep_shards(db, hot).items():
+            balances[account_id] += moved
+        for account_id, shards in hot.items():
+            hot_accounts.set(account_id, shards)  # so single writes go to the shards
+
+    deltas = defaultdict(int)
+    reservations = []  # velocity reservations of accepted withdrawals
+    results, accepted = [], []
+    for index, item in enumerate(items):
+        required = user_id if user_ids is None else user_ids[index]
+        if item.account_id not in owners or (required is not None and owners[item.account_id] != required):
+            results.append({"index": index, "ok": False, "error": "Unauthorized access to this account"})
+            continue
+        try:
+            minor = to_minor(item.amount)
+        except ValueError as e:
+            results.append({"index": index, "ok": False, "error": str(e)})
+            continue
+        if item.type == schemas.TransactionType.DEPOSIT:
+            change = minor
+        elif item.type == schemas.TransactionType.WITHDRAW:
+            if balances[item.account_id] < minor:
+                results.append({"index": index, "ok": False, "error": "Insufficient funds"})
+                continue
+            try:
+                reservations.append(velocity.check(db, item.account_id, minor))
+            except ValueError as e:
+                results.append({"index": index, "ok": False, "error": str(e)})
+                continue
+            change = -minor
+        else:
+            results.append({"index": index, "ok": False, "error": "Invalid transaction type"})
+            continue
+        balances[item.account_id] += change
+        deltas[item.account_id] += change
+        accepted.append(index)
+        results.append({"index": index, "ok": True})
+
+    failed = len(items) - len(accepted)
+    if not accepted or (atomic and failed):
+        db.rollback()
+        for reservation in reservations:
+            velocity.release(reservation)
+        for result in results:
+            if result["ok"]:
+                result.update(ok=False, error="Not applied: batch rolled back")
+        return {"committed": False, "succeeded": 0, "failed": len(items), "results": results}
+
+    try:
+        accounts = models.Account.__table__
+        db.execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam("_id"))
+            .values(balance_minor=accounts.c.balance_minor + bindparam("_delta")),
+            [{"_id": account_id, "_delta": delta} for account_id, delta in deltas.items()],
+        )
+
+        now = datetime.utcnow()
+        postings = []
+        for i in accepted:
+            minor = to_minor(items[i].amount)
+            signed = minor if items[i].type == schemas.TransactionType.DEPOSIT else -minor
+            postings.append(_posting(items[i].account_id, items[i].type.value, signed, now))
+        new_ids = post_journal(db, postings)
+        touch_users(db, (owners[account_id] for account_id in deltas))
+        db.commit()
+    except BaseException:
+        for reservation in reservations:
+            velocity.release(reservation)
+        raise
+
+    for index, new_id in zip(accepted, new_ids):
+        item = items[index]
+        results[index]["transaction"] = {
+            "id": new_id, "account_id": item.account_id, "type": item.type.value,
+            "amount": item.amount, "created_at": now,
+        }
+    return {"committed": True, "succeeded": len(accepted), "failed": failed, "results": results}
+
+
+def to_minor(amount: float) -> int:
     """
-    Retrieve all transactions or only those belonging to a user's accounts.
+    Convert an API amount to integer minor units (cents).
+
+    Raises:
+        ValueError: If the amount is not finite, does not fit the BigInteger
+            balance columns, or has fractions of a cent.
+    """
+    if not math.isfinite(amount * MINOR_UNITS):
+        raise ValueError("Amount is out of range")
+    minor = round(amount * MINOR_UNITS)
+    if abs(minor) > MAX_MINOR:
+        raise ValueError("Amount is out of range")
+    if abs(minor - amount * MINOR_UNITS) > 1e-6:
+        raise ValueError("Amount must be a whole number of cents")
+    return minor
+
+
+def _posting(account_id: int, type: str, signed_minor: int, timestamp: datetime) -> dict:
+    """
+    A deposit/withdrawal/opening posting: the account's leg and the matching
+    leg against the outside world (account_id NULL).
+    """
+    return {
+        "header": {"account_id": account_id, "type": type,
+                   "amount": abs(signed_minor) / MINOR_UNITS, "timestamp": timestamp},
+        "legs": [(account_id, type, signed_minor), (None, type, -signed_minor)],
+    }
+
+
+def _transfer_posting(from_account_id: int, to_account_id: int, minor: int, timestamp: datetime) -> dict:
+    """A transfer posting: debit the source account, credit the destination."""
+    return {
+        "header": {"account_id": from_account_id, "type": "transfer",
+                   "amount": minor / MINOR_UNITS, "timestamp": timestamp},
+        "legs": [(from_account_id, "transfer_out", -minor), (to_account_id, "transfer_in", minor)],
+    }
+
+
+def post_journal(db: Session, postings: list[dict], shard: int = 0) -> list[int]:
+    """
+    Append postings to the journal without committing.
+
+    Headers go in with one multi-row ``INSERT ... RETURNING`` and all legs
+    with one executemany, however many postings there are; the monthly
+    aggregates are upserted in the same transaction.
+
+    Args:
+        db (Session): Database session.
+        postings (list[dict]): Built by `_posting` / `_transfer_posting`.
+        shard (int): Monthly aggregate shard to count the entries in.
+
+    Returns:
+        list[int]: The new transaction IDs, in posting order.
+    """
+    transactions = models.Transaction.__table__
+    ids = db.execute(
+        insert(transactions).returning(transactions.c.id, sort_by_parameter_order=True),
+        [posting["header"] for posting in postings],
+    ).scalars().all()
+    entries = [
+        {"transaction_id": transaction_id, "account_id": account_id, "kind": kind,
+         "amount_minor": amount_minor, "created_at": posting["header"]["timestamp"]}
+        for transaction_id, posting in zip(ids, postings)
+        for account_id, kind, amount_minor in posting["legs"]
+    ]
+    db.execute(insert(models.JournalEntry.__table__), entries)
+    add_entries(db, entries, shard)
+    return ids
+
+
+def touch_users(db: Session, user_ids):
+    """
+    Bump the data_version of users whose accounts or history changed (without committing).
+
+    Called after the write's other row locks, taking the user rows in
+    ascending id order, so it cannot deadlock with another writer.
+    """
+    ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    if not ids:
+        return
+    users = models.User.__table__
+    if len(ids) > 1:
+        db.execute(select(users.c.id).where(users.c.id.in_(ids)).order_by(users.c.id).with_for_update())
+    db.execute(update(users).where(users.c.id.in_(ids)).values(data_version=users.c.data_version + 1))
+
+
+def get_data_version(db: Session, user_id: int) -> int | None:
+    """
+    Return a user's data version, or None if there is no such user.
+
+    That is users.data_version plus the write counts of the user's hot
+    account shards, which change instead of it on shard writes. One
+    statement: a primary-key lookup and an indexed sum.
+    """
+    s = models.AccountShard
+    shard_writes = select(func.coalesce(func.sum(s.version), 0)).where(s.user_id == user_id).scalar_subquery()
+    return db.execute(
+        select(models.User.data_version + shard_writes).where(models.User.id == user_id)
+    ).scalar()
+
+
+def get_balance_as_of(db: Session, account_id: int, as_of: datetime) -> float:
+    """
+    Return an account's balance at a point in time.
+
+    Starts from the latest daily snapshot before `as_of` and replays only
+    the journal entries after it, so the cost is bounded by one day of
+    activity (plus any days the compaction job has not reached yet) rather
+    than by the whole history. Entries in archived months are read from
+    the archive.
+
+    Args:
+        db (Session): Database session.
+        account_id (int): Account to report on.
+        as_of (datetime): Point in time; naive values are taken as UTC.
+
+    Returns:
+        float: The balance, counting entries created strictly before `as_of`.
+    """
+    if as_of.tzinfo is not None:
+        as_of = as_of.astimezone(timezone.utc).replace(tzinfo=None)
+    s = models.BalanceSnapshot
+    snapshot = db.execute(
+        select(s.day, s.balance_minor)
+        .where(s.account_id == account_id, s.day < as_of.date())
+        .order_by(s.day.desc())
+        .limit(1)
+    ).first()
+
+    e = models.JournalEntry
+    delta = select(func.coalesce(func.sum(e.amount_minor), 0)).where(e.account_id == account_id, e.created_at < as_of)
+    balance, since = 0, None
+    if snapshot is not None:
+        since = datetime.combine(snapshot.day + timedelta(days=1), datetime.min.time())
+        delta = delta.where(e.created_at >= since)
+        balance = snapshot.balance_minor
+    archived = archive.sums(account_id, account_id + 1, since, as_of).get(account_id, 0)
+    return (balance + archived + db.execute(delta).scalar()) / MINOR_UNITS
+
+
+def get_summary(
+    db: Session,
+    account_id: int | None = None,
+    user_id: int | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> dict:
+    """
+    Summarize money movements per kind from the monthly aggregates.
+
+    Args:
+        db (Session): Database session.
+        account_id (int | None): Summarize this account...
+        user_id (int | None): ...or all accounts of this user.
+        start (date | None): First month to include (any day in it).
+        end (date | None): Last month to include (any day in it).
+
+    Returns:
+        dict: For each entry kind, ``count``, ``total`` and ``average``.
+    """
+    a = models.MonthlyAggregate
+    stmt = select(a.kind, func.sum(a.tx_count), func.sum(a.total_minor)).group_by(a.kind)
+    if account_id is not None:
+        stmt = stmt.where(a.account_id == account_id)
+    if user_id is not None:
+        stmt = stmt.where(a.account_id.in_(select(models.Account.id).where(models.Account.user_id == user_id)))
+    if start is not None:
+        stmt = stmt.where(a.month >= start.replace(day=1))
+    if end is not None:
+        stmt = stmt.where(a.month <= end.replace(day=1))
+    totals = {kind: (int(count), int(total)) for kind, count, total in db.execute(stmt).all()}
+
+    summary = {}
+    for kind in schemas.EntryKind:
+        count, total = totals.get(kind.value, (0, 0))
+        summary[kind.value] = {
+            "count": count,
+            "total": total / MINOR_UNITS,
+            "average": round(total / count / MINOR_UNITS, 2) if count else 0.0,
+        }
+    return summary
+
+
+def get_checkpoint(db: Session, name: str) -> str | None:
+    """Return the saved progress marker of a background job, or None."""
+    return db.execute(select(models.JobCheckpoint.value).where(models.JobCheckpoint.name == name)).scalar()
+
+
+def set_checkpoint(db: Session, name: str, value: str):
+    """Save a background job's progress marker (without committing)."""
+    db.merge(models.JobCheckpoint(name=name, value=value))
+
+
+def _raise_for_account(db: Session, account_id: int, user_id: int | None):
+    """Raise PermissionError if the account is missing or owned by someone else."""
+    owner = get_account_owner(db, account_id)
+    if owner is None or (user_id is not None and owner != user_id):
+        raise PermissionError("Unauthorized access to this account")
+
+
+def _check_velocity(db: Session, account_id: int, minor: int):
+    """
+    Reserve a debit of `minor` against the account's velocity limits.
+
+    Roll back and raise ValueError if it would exceed them. The caller must
+    release the returned reservation if its write then fails to commit.
+    """
+    try:
+        return velocity.check(db, account_id, minor)
+    except ValueError:
+        db.rollback()
+        raise
+
+
+def _reject_cached_foreign(user_id: int | None, *account_ids: int):
+    """
+    Raise PermissionError early if the owner cache already shows an account
+    belongs to someone else. Cache misses fall through to the database check.
+    """
+    if user_id is None:
+        return
+    for account_id in account_ids:
+        owner = account_owners.get(account_id)
+        if owner is not None and owner != user_id:
+            raise PermissionError("Unauthorized access to this account")
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque cursor string."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def get_transactions(
+    db: Session,
+    user_id: int | None = None,
+    account_id: int | None = None,
+    type: schemas.EntryKind | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    after: str | None = None,
+    before: str | None = None,
+    limit: int = 50,
+):
+    """
+    Retrieve one page of transaction history, newest first, using keyset pagination.
+
+    History is read from the journal, so a transfer shows up on both of its
+    accounts. Pages are delimited by (timestamp, entry id) cursors rather
+    than offsets, so the cost of a page does not depend on how deep into the
+    history it is. Pages reaching past the oldest month in the database
+    continue into the archive (see `archive`).
 
     Args:
         db (Session): Database session.
         user_id (int | None): Optional user ID filter.
+        account_id (int | None): Only transactions on this account.
+        type (schemas.EntryKind | None): Only entries of this kind.
+        min_amount (float | None): Inclusive lower bound on the amount.
+        max_amount (float | None): Inclusive upper bound on the amount.
+        start (datetime | None): Inclusive lower bound on the timestamp.
+        end (datetime | None): Exclusive upper bound on the timestamp.
+        after (str | None): Cursor; return transactions older than it.
+        before (str | None): Cursor; return transactions newer than it.
+        limit (int): Maximum number of transactions to return.
+
+    Raises:
+        ValueError: If a cursor is malformed or both cursors are given.
 
     Returns:
-        list[models.Transaction]: List of transactions.
+        dict: ``items`` plus ``next_cursor``/``prev_cursor`` (None at either end).
     """
-    query = db.query(models.Transaction)
+    if after and before:
+        raise ValueError("Use either 'after' or 'before', not both")
+
+    e = models.JournalEntry
+    position = (e.created_at, e.id)
+    stmt = select(e.id, e.transaction_id, e.account_id, e.kind, e.amount_minor, e.created_at)
     if user_id:
-        query = (
-            query.join(models.Account)
-            .filter(models.Account.user_id == user_id)
+        stmt = (
+            stmt.join(models.Account, models.Account.id == e.account_id)
+            .where(models.Account.user_id == user_id)
         )
-    return query.all()
-
+    else:
+        stmt = stmt.where(e.account_id.is_not(None))
+    if account_id is not None:
+        stmt = stmt.where(e.account_id == account_id)
+    if type is not None:
+        stmt = stmt.where(e.kind == type.value)
+    min_minor = math.ceil(min_amount * MINOR_UNITS - 1e-6) if min_amount is not None else None
+    max_minor = math.floor(max_amount * MINOR_UNITS + 1e-6) if max_amount is not None else None
+    if min_minor is not None:
+        stmt = stmt.where(func.abs(e.amount_minor) >= min_minor)
+    if max_minor is not None:
+        stmt = stmt.where(func.abs(e.amount_minor) <= max_minor)
+    if start is not None:
+        stmt = stmt.where(e.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(e.created_at < end)
+
+    def archived(count: int, **cursor) -> list:
+        # Archived months are older than anything in the database.
+        if count <= 0 or not archive.months():
+            return []
+        account_ids = [account_id] if account_id is not None else None
+        if account_ids is None and user_id:
+            account_ids = db.execute(select(models.Account.id).where(models.Account.user_id == user_id)).scalars().all()
+        entries = archive.iter_entries(
+            account_ids, start, end, type.value if type is not None else None, min_minor, max_minor, **cursor,
+        )
+        return list(islice(chain.from_iterable(entries), count))
+
+    if before:
+        # Walk forwards from the cursor, then flip back to newest-first.
+        cursor = decode_cursor(before)
+        stmt = stmt.where(tuple_(*position) > tuple_(*cursor))
+        rows = archived(limit + 1, before=cursor)
+        if len(rows) <= limit:
+            rows += db.execute(stmt.order_by(*position).limit(limit + 1 - len(rows))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit][::-1]
+    else:
+        cursor = decode_cursor(after) if after else None
+        if cursor:
+            stmt = stmt.where(tuple_(*position) < tuple_(*cursor))
+        rows = db.execute(stmt.order_by(*(column.desc() for column in position)).limit(limit + 1)).all()
+        rows += archived(limit + 1 - len(rows), after=cursor, newest_first=True)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+    older = has_more if not before else bool(rows)
+    newer = has_more if before else bool(after and rows)
+    return {
+        # In `schemas.Transaction` field order, ready to serialize as is.
+        "items": [
+            {"type": row.kind, "amount": abs(row.amount_minor) / MINOR_UNITS, "id": row.transaction_id,
+             "account_id": row.account_id, "created_at": row.created_at}
+            for row in rows
+        ],
+        "next_cursor": encode_cursor(last.created_at, last.id) if older else None,
+        "prev_cursor": encode_cursor(first.created_at, first.id) if newer else None,
+    }
@@ -0,0 +1,53 @@
+"""
+Async versions of the CRUD operations in `crud`.
+
+Each function takes either a Session or an AsyncSession (see
+`database.get_session`) and runs the matching `crud` function through
+`database.run_sync`, so both modes share one implementation of every query
+and business rule.
+"""
+
+import functools
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from .database import run_sync
+
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await run_sync(db, fn, *args, **kwargs)
+    return wrapper
+
+
+create_user = _awaitable(crud.create_user)
+get_user = _awaitable(crud.get_user)
+get_user_profile = _awaitable(crud.get_user_profile)
+get_user_by_email = _awaitable(crud.get_user_by_email)
+update_password_hash = _awaitable(crud.update_password_hash)
+authenticate_user = _awaitable(crud.authenticate_user)
+get_users = _awaitable(crud.get_users)
+create_account = _awaitable(crud.create_account)
+get_accounts = _awaitable(crud.get_accounts)
+get_account_owner = _awaitable(crud.get_account_owner)
+get_data_version = _awaitable(crud.get_data_version)
+get_balance_as_of = _awaitable(crud.get_balance_as_of)
+get_summary = _awaitable(crud.get_summary)
+create_transaction = _awaitable(crud.create_transaction)
+transfer_funds = _awaitable(crud.transfer_funds)
+create_transactions_batch = _awaitable(crud.create_transactions_batch)
+get_transactions = _awaitable(crud.get_transactions)
+
+
+async def iter_statement(db: AsyncSession, account_id: int, start: datetime | None = None,
+                         end: datetime | None = None, batch_size: int = 1000):
+    """Async counterpart of `crud.iter_statement`, streaming via AsyncSession.stream."""
+    for rows in crud.archived_statement(account_id, start, end, batch_size):
+        yield rows
+    stmt = crud.statement_query(account_id, start, end).execution_options(yield_per=batch_size)
+    result = await db.stream(stmt)
+    async for partition in result.partitions():
+        yield partition
@@ -1,6 +1,15 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from typing import Union
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from .cache import recent_writers
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -14,8 +23,288 @@ else:
     DB_NAME = os.getenv("POSTGRES_DB", "litebank_db")
     SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# READ_DATABASE_URL points read-only routes at a replica (see
+# `open_read_session`); unset, every session uses the primary.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+
+# DB_ASYNC=1 serves requests from an AsyncEngine (asyncpg / aiosqlite)
+# instead of the sync engine on Starlette's threadpool.
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+
+
+def async_url(url: str) -> str:
+    """Map a sync database URL onto the matching asyncio driver."""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("postgresql"):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# Connection pool sizing (ignored for in-memory SQLite, which needs one
+# shared connection).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "1")
+
+# SQLite performance profile, applied to every new connection.
+SQLITE_WAL = _env_flag("SQLITE_WAL", "1")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class PoolStats:
+    """Counts pool checkouts and how long they waited for a free connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class _TimedCheckout:
+    """Pool mixin that times every checkout into ``self.stats``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options(url: str, poolclass) -> dict:
+    """Keyword arguments for create_engine/create_async_engine from the env."""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if url.startswith("sqlite") and (":memory:" in url or url.endswith("://")):
+        return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS:d}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={-SQLITE_CACHE_SIZE_KB:d}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE:d}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _apply_replica_pragmas(dbapi_connection, connection_record):
+    """Also refuse writes, so a write routed to the replica fails loudly."""
+    _apply_sqlite_pragmas(dbapi_connection, connection_record)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL, TimedQueuePool))
+# Objects stay loaded after commit so handlers can return them without a
+# refresh round trip per row.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = (
+    create_async_engine(async_url(SQLALCHEMY_DATABASE_URL), **_engine_options(SQLALCHEMY_DATABASE_URL, TimedAsyncQueuePool))
+    if DB_ASYNC else None
+)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if DB_ASYNC else None
+)
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+# The replica's engines, or the primary's when there is no replica.
+if READ_DATABASE_URL:
+    read_engine = create_engine(READ_DATABASE_URL, **_engine_options(READ_DATABASE_URL, TimedQueuePool))
+    async_read_engine = (
+        create_async_engine(async_url(READ_DATABASE_URL), **_engine_options(READ_DATABASE_URL, TimedAsyncQueuePool))
+        if DB_ASYNC else None
+    )
+    if read_engine.dialect.name == "sqlite":
+        event.listen(read_engine, "connect", _apply_replica_pragmas)
+        if async_read_engine is not None:
+            event.listen(async_read_engine.sync_engine, "connect", _apply_replica_pragmas)
+else:
+    read_engine, async_read_engine = engine, async_engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine)
+AsyncReadSessionLocal = (
+    async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False) if DB_ASYNC else None
+)
+
+
+def pool_status() -> dict:
+    """
+    Report occupancy and checkout wait times for each connection pool.
+
+    ``saturation`` is the share of the pool's total capacity (size plus
+    overflow) that is checked out right now.
+    """
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.sync_engine.pool
+    if READ_DATABASE_URL:
+        pools["sync_read"] = read_engine.pool
+        if async_read_engine is not None:
+            pools["async_read"] = async_read_engine.sync_engine.pool
+    status = {}
+    for name, pool in pools.items():
+        if not isinstance(pool, QueuePool):
+            status[name] = {"pool": type(pool).__name__}
+            continue
+        # Every QueuePool is built from `_engine_options`, so its overflow is
+        # DB_MAX_OVERFLOW. A negative value means unbounded: no saturation.
+        capacity = pool.size() + DB_MAX_OVERFLOW if DB_MAX_OVERFLOW >= 0 else 0
+        stats = getattr(pool, "stats", PoolStats())
+        status[name] = {
+            "pool": type(pool).__name__,
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(pool.checkedout() / capacity, 3) if capacity > 0 else None,
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_seconds_total": round(stats.wait_seconds_total, 6),
+            "wait_seconds_max": round(stats.wait_seconds_max, 6),
+        }
+    return status
 
 Base = declarative_base()
 
+AnySession = Union[Session, AsyncSession]
+
+
+def get_db():
+    """
+    Provide a sync database session dependency.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """
+    Provide an async database session dependency.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db():
+    """
+    Provide a sync session on the read replica (the primary if none is configured).
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """
+    Provide an async session on the read replica (the primary if none is configured).
+    """
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+# The session dependency every router uses; its flavour follows DB_ASYNC.
+get_session = get_async_db if DB_ASYNC else get_db
+# Read-only routes with no user to keep consistent (see
+# `dependencies.get_routed_session` for the rest).
+get_read_session = get_async_read_db if DB_ASYNC else get_read_db
+
+
+def pin_to_primary(user_id: int):
+    """
+    Send a user's reads to the primary for the next READ_STICKY_SECONDS.
+
+    Called after a user writes, so their next reads see the write even
+    while the replica lags behind. Does nothing without a replica.
+    """
+    if READ_DATABASE_URL:
+        recent_writers.set(user_id, 1)
+
+
+def open_read_session(user_id: int | None = None) -> AnySession:
+    """
+    Open a session for read-only work, on the replica unless `user_id` wrote recently.
+
+    Use it as a (async) context manager, matching DB_ASYNC.
+
+    Args:
+        user_id (int | None): User the reads are for; None if anonymous.
+
+    Returns:
+        AnySession: A session on the replica, or on the primary while the
+            user is pinned to it (see `pin_to_primary`).
+    """
+    primary = READ_DATABASE_URL is not None and user_id is not None and recent_writers.get(user_id) is not None
+    if DB_ASYNC:
+        return (AsyncSessionLocal if primary else AsyncReadSessionLocal)()
+    return (SessionLocal if primary else ReadSessionLocal)()
+
+
+async def run_sync(db: AnySession, fn, *args, **kwargs):
+    """
+    Await a sync ``fn(session, ...)`` against either kind of session.
+
+    AsyncSession runs it on its greenlet bridge, so I/O goes through the
+    asyncio driver; a plain Session runs it on the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
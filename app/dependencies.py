@@ -0,0 +1,76 @@
+"""
+Shared FastAPI dependencies.
+"""
+
+import time
+
+from fastapi import Depends, Request
+from fastapi_jwt_auth import AuthJWT
+
+from . import database
+from .cache import principals
+from .ratelimit import bearer_token
+
+
+async def get_current_user_id(request: Request, Authorize: AuthJWT = Depends()) -> int:
+    """
+    Resolve the authenticated user's ID from the bearer token.
+
+    A verified token's subject is cached until the token expires (or the
+    cache TTL elapses, whichever is sooner), so repeat calls from the same
+    client skip decoding and signature verification. A cached token is
+    therefore accepted until then even if it is revoked, e.g. by a deny
+    list checked in `AuthJWT`; keep CACHE_TTL_SECONDS short if that matters.
+
+    Args:
+        request (Request): The request, whose Authorization header holds the token.
+        Authorize (AuthJWT): JWT authorization dependency.
+
+    Raises:
+        AuthJWTException: If the token is missing, invalid or expired.
+
+    Returns:
+        int: ID of the authenticated user.
+    """
+    token = bearer_token(request.scope)
+    if token:
+        user_id = principals.get(token)
+        if user_id is not None:
+            return user_id
+
+    Authorize.jwt_required()
+    claims = Authorize.get_raw_jwt()
+    user_id = int(claims["sub"])
+    expires_in = claims.get("exp", float("inf")) - time.time()
+    if token and expires_in > 0:
+        principals.set(token, user_id, ttl=min(principals.ttl, expires_in))
+    return user_id
+
+
+def _get_routed_db(current_user_id: int = Depends(get_current_user_id)):
+    with database.open_read_session(current_user_id) as db:
+        yield db
+
+
+async def _get_async_routed_db(current_user_id: int = Depends(get_current_user_id)):
+    async with database.open_read_session(current_user_id) as db:
+        yield db
+
+
+# Session for a read-only route of the authenticated user: the read
+# replica, or the primary right after the user wrote (read-your-writes).
+get_routed_session = _get_async_routed_db if database.DB_ASYNC else _get_routed_db
+
+
+async def pins_reads(current_user_id: int = Depends(get_current_user_id)):
+    """
+    Route dependency for writes: keeps the user's reads on the primary afterwards.
+
+    The pin is refreshed once the route has finished, before the response
+    goes out, so the sticky window always starts after the commit. Declare
+    it as ``Depends(pins_reads, scope="function")``: with the default
+    request scope the refresh would only run after the response was sent.
+    """
+    database.pin_to_primary(current_user_id)
+    yield
+    database.pin_to_primary(current_user_id)
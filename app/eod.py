@@ -0,0 +1,255 @@
+"""
+End-of-day batch: daily interest accrual and low-balance fees.
+
+For a business date (a closed UTC day), every account that existed at the
+end of that day is charged, based on its closing balance:
+
+- interest at EOD_INTEREST_APR / 365 on a positive balance, rounded down
+  to the cent, and
+- EOD_LOW_BALANCE_FEE if the balance is below EOD_MIN_BALANCE (never more
+  than the account holds).
+
+Accounts are processed in id-ordered chunks. Each chunk's balances (with
+hot accounts' shards) are read into NumPy arrays, the postings are computed vectorized, and the chunk is
+written in one database transaction: one journal transaction per kind
+with a leg per account (`crud.post_journal`), balances with one set-based
+UPDATE, and the run's checkpoint. Postings are dated at the first instant
+after the business date (00:00 of the next day), so they count towards that
+next day's closing balance. A run is refused once balance snapshots (see
+`snapshots`) cover that day, since the snapshot would miss the postings;
+compaction's lag keeps the next day open while a normal nightly run
+finishes. Closing an older date is only possible before its next day has
+been compacted.
+
+Because the checkpoint (`eod:<date>` in job_checkpoints) commits together
+with the postings, rerunning a date after a crash resumes after the last
+committed chunk, and rerunning a finished date posts nothing.
+
+Usage:
+    python -m app.eod                       # yesterday (UTC)
+    python -m app.eod --date 2025-06-30 --chunk 50000
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, func, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from . import crud, models, snapshots
+from .database import SessionLocal
+
+INTEREST_APR = float(os.getenv("EOD_INTEREST_APR", "0.01"))
+LOW_BALANCE_FEE = float(os.getenv("EOD_LOW_BALANCE_FEE", "0"))
+MIN_BALANCE = float(os.getenv("EOD_MIN_BALANCE", "0"))
+DAY_COUNT = 365
+CHUNK = 20000
+
+
+def _add_shards(db: Session, ids: np.ndarray, balances: np.ndarray) -> np.ndarray:
+    """Add hot accounts' shard balances (minor units), locking the shard rows after the accounts'."""
+    s = models.AccountShard
+    shards = db.execute(
+        select(s.account_id, s.balance_minor)
+        .where(s.account_id >= int(ids[0]), s.account_id <= int(ids[-1]))
+        .order_by(s.account_id, s.shard)
+        .with_for_update()
+    ).all()
+    if not shards:
+        return balances
+    shard_ids, shard_balances = (np.array(column, dtype=np.int64) for column in zip(*shards))
+    found = np.searchsorted(ids, shard_ids)
+    match = found < len(ids)
+    match[match] = ids[found[match]] == shard_ids[match]
+    total = balances.copy()
+    np.add.at(total, found[match], shard_balances[match])
+    return total
+
+
+def _closing_balances(db: Session, ids: np.ndarray, balances: np.ndarray, cutoff: datetime) -> np.ndarray:
+    """Roll current balances (minor units) back to `cutoff` by undoing later journal entries."""
+    e = models.JournalEntry
+    later = db.execute(
+        select(e.account_id, func.sum(e.amount_minor))
+        .where(e.created_at >= cutoff, e.account_id >= int(ids[0]), e.account_id <= int(ids[-1]))
+        .group_by(e.account_id)
+    ).all()
+    closing = balances.copy()
+    if later:
+        later_ids, later_sums = (np.array(column, dtype=np.int64) for column in zip(*later))
+        # The id range can include accounts left out of the chunk (opened after the cutoff).
+        found = np.searchsorted(ids, later_ids)
+        match = ids[found] == later_ids
+        closing[found[match]] -= later_sums[match]
+    return closing
+
+
+def _batch_posting(kind: str, ids: np.ndarray, amounts: np.ndarray, timestamp: datetime) -> dict:
+    """
+    One journal transaction for a whole chunk: a leg per account and a single
+    balancing leg against the outside world, instead of a header per account.
+    """
+    total = int(amounts.sum())
+    legs = [(account_id, kind, amount) for account_id, amount in zip(ids.tolist(), amounts.tolist())]
+    return {
+        "header": {"account_id": None, "type": kind, "amount": abs(total) / crud.MINOR_UNITS, "timestamp": timestamp},
+        "legs": legs + [(None, kind, -total)],
+    }
+
+
+def _update_balances(db: Session, ids: np.ndarray, deltas: np.ndarray):
+    """Add per-account deltas (minor units) to balances in one statement."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text(
+                "UPDATE accounts SET balance_minor = accounts.balance_minor + v.delta "
+                "FROM unnest(CAST(:ids AS integer[]), CAST(:deltas AS bigint[])) AS v(id, delta) "
+                "WHERE accounts.id = v.id"
+            ),
+            {"ids": ids.tolist(), "deltas": deltas.tolist()},
+        )
+    else:
+        accounts = models.Account.__table__
+        db.execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam("_id"))
+            .values(balance_minor=accounts.c.balance_minor + bindparam("_delta")),
+            [{"_id": i, "_delta": d} for i, d in zip(ids.tolist(), deltas.tolist())],
+        )
+
+
+def _touch_owners(db: Session, first: int, last: int):
+    """Bump data_version (see `crud.touch_users`) for the owners of accounts in the chunk's id range."""
+    users = models.User.__table__
+    owners = select(models.Account.user_id).where(models.Account.id >= first, models.Account.id <= last)
+    db.execute(update(users).where(users.c.id.in_(owners)).values(data_version=users.c.data_version + 1))
+
+
+def _process_chunk(db: Session, name: str, after: int, business_date: date, chunk: int) -> dict | None:
+    """
+    Post interest and fees for the next `chunk` accounts with id > `after`, and commit.
+
+    Returns:
+        dict | None: The chunk's last account id and totals, or None when
+        no accounts are left (the run is then marked done).
+
+    Raises:
+        RuntimeError: If another process advanced this date's checkpoint, or
+            the posting day has been compacted into balance snapshots.
+    """
+    cutoff = datetime.combine(business_date + timedelta(days=1), datetime.min.time())
+    a = models.Account
+    rows = db.execute(
+        select(a.id, a.balance_minor)
+        .where(a.id > after, or_(a.created_at.is_(None), a.created_at < cutoff))
+        .order_by(a.id)
+        .limit(chunk)
+        .with_for_update()
+    ).all()
+
+    # Checked after taking the row locks, so a concurrent run of the same date
+    # that got there first is noticed instead of posting the chunk twice.
+    saved = crud.get_checkpoint(db, name)
+    state = json.loads(saved) if saved else {"after": 0, "done": False}
+    if state["after"] != after or state["done"]:
+        db.rollback()
+        raise RuntimeError(f"End of day for {business_date} was advanced by another run")
+    compacted = crud.get_checkpoint(db, snapshots.CHECKPOINT)
+    if compacted is not None and date.fromisoformat(compacted) >= cutoff.date():
+        db.rollback()
+        raise RuntimeError(f"End of day for {business_date} would post into {cutoff.date()}, "
+                           f"which balance snapshots already cover (up to {compacted})")
+
+    if not rows:
+        crud.set_checkpoint(db, name, json.dumps({"after": after, "done": True}))
+        db.commit()
+        return None
+
+    account_ids, balances = zip(*rows)
+    ids = np.array(account_ids, dtype=np.int64)
+    current = np.array(balances, dtype=np.int64)
+    current = _add_shards(db, ids, current)
+    closing = _closing_balances(db, ids, current, cutoff)
+
+    interest = np.where(closing > 0, np.floor(closing * (INTEREST_APR / DAY_COUNT)), 0).astype(np.int64)
+    fee = np.where(closing < round(MIN_BALANCE * crud.MINOR_UNITS), round(LOW_BALANCE_FEE * crud.MINOR_UNITS), 0)
+    # Never take more than the account holds, at the close or now.
+    fee = np.minimum(fee, np.maximum(np.minimum(closing, current), 0)).astype(np.int64)
+
+    postings = [
+        _batch_posting(kind, ids[amounts != 0], amounts[amounts != 0], cutoff)
+        for kind, amounts in (("interest", interest), ("fee", -fee))
+        if amounts.any()
+    ]
+    delta = interest - fee
+    changed = delta != 0
+    if postings:
+        crud.post_journal(db, postings)
+        _update_balances(db, ids[changed], delta[changed])
+        _touch_owners(db, int(ids[0]), int(ids[-1]))
+    crud.set_checkpoint(db, name, json.dumps({"after": int(ids[-1]), "done": False}))
+    db.commit()
+    return {
+        "after": int(ids[-1]),
+        "accounts": len(ids),
+        "interest": int(interest.sum()),
+        "fees": int(fee.sum()),
+    }
+
+
+def run(db: Session, business_date: date | None = None, chunk: int = CHUNK) -> dict:
+    """
+    Post interest and fees for a business date, resuming if it was interrupted.
+
+    Args:
+        db (Session): Database session.
+        business_date (date | None): Day to close; defaults to yesterday (UTC).
+        chunk (int): Accounts per database transaction.
+
+    Returns:
+        dict: Accounts processed, interest and fees posted by this invocation,
+        and elapsed time.
+
+    Raises:
+        ValueError: If the business date has not ended yet.
+        RuntimeError: If another process is running the same date, or the
+            day the postings fall on has already been snapshotted.
+    """
+    today = datetime.utcnow().date()
+    business_date = business_date or today - timedelta(days=1)
+    if business_date >= today:
+        raise ValueError(f"Business date {business_date} has not closed yet")
+
+    started = time.perf_counter()
+    name = f"eod:{business_date.isoformat()}"
+    saved = crud.get_checkpoint(db, name)
+    state = json.loads(saved) if saved else {"after": 0, "done": False}
+    totals = {"date": business_date.isoformat(), "accounts": 0, "interest": 0.0, "fees": 0.0}
+    if state["done"]:
+        return {**totals, "already_done": True, "seconds": 0.0}
+
+    after = state["after"]
+    while (result := _process_chunk(db, name, after, business_date, chunk)) is not None:
+        after = result["after"]
+        totals["accounts"] += result["accounts"]
+        totals["interest"] += result["interest"] / crud.MINOR_UNITS
+        totals["fees"] += result["fees"] / crud.MINOR_UNITS
+    return {**totals, "interest": round(totals["interest"], 2), "fees": round(totals["fees"], 2),
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, help="Business date (default: yesterday, UTC)")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="Accounts per transaction")
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(run(db, args.date, args.chunk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Conditional GET for the per-user list endpoints.
+
+Every write to a user's accounts or history bumps `users.data_version`
+in the same database transaction (see `crud.touch_users`). A response's
+strong ETag combines the resource, the user, that version and the query
+string, so an unchanged version means a byte-identical body. A request
+whose If-None-Match matches is answered with 304 after one primary-key
+lookup, without loading accounts or transactions.
+
+The version is read before the data. A write that lands in between gives
+an older tag with newer data, which only costs the client one extra full
+response later.
+"""
+
+import hashlib
+
+from fastapi import Request, Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag(request: Request, resource: str, user_id: int, version: int) -> str:
+    """Strong ETag for `resource` as seen by `user_id` at `version`, with this request's query."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+    return f'"{resource}-{user_id}-{version}-{digest}"'
+
+
+def not_modified(request: Request, tag: str) -> Response | None:
+    """Return a 304 response if the request's If-None-Match matches `tag`, else None."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    if tag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def headers(tag: str) -> dict[str, str]:
+    """Headers to send with a full response tagged `tag`."""
+    return {"ETag": tag, "Cache-Control": CACHE_CONTROL}
@@ -0,0 +1,142 @@
+"""
+Group commit for single deposits and withdrawals.
+
+With GROUP_COMMIT=1, ``POST /transactions/`` does not open its own database
+transaction. Each call is queued for a single writer task per process,
+which takes everything queued (up to GROUP_COMMIT_MAX_BATCH items, waiting
+at most GROUP_COMMIT_WINDOW_MS for more to arrive) and applies it with
+`crud.create_transactions_batch` in best-effort mode. That is one commit,
+and so one WAL flush, per batch instead of per request. Every caller gets
+back its own transaction or error.
+
+Items are applied strictly in arrival order by one writer, so operations
+on the same account keep the order in which the requests reached this
+process. The window trades latency for throughput: a lone request waits
+up to the window before committing, while under load batches fill before
+the window expires. Benchmark: ``python -m benchmarks.group_commit``.
+
+Configuration (environment):
+    GROUP_COMMIT              1 to enable (default 0).
+    GROUP_COMMIT_WINDOW_MS    how long to wait for a batch to fill (default 2).
+    GROUP_COMMIT_MAX_BATCH    maximum items per commit (default 256).
+"""
+
+import asyncio
+import os
+
+from . import crud, database, schemas
+from .metrics import GROUP_COMMIT_BATCH
+
+GROUP_COMMIT = database._env_flag("GROUP_COMMIT", "0")
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "256"))
+
+# Per-item errors from create_transactions_batch that are not a ValueError
+_ERRORS = {"Unauthorized access to this account": PermissionError}
+
+
+class GroupCommitWriter:
+    """
+    Queue of pending transactions drained by one background writer task.
+
+    Args:
+        window_ms (float): Time to wait for a batch to fill after its first item.
+        max_batch (int): Maximum items applied per commit.
+    """
+
+    def __init__(self, window_ms: float = GROUP_COMMIT_WINDOW_MS, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def submit(self, transaction: schemas.TransactionCreate, user_id: int | None = None) -> dict:
+        """
+        Queue a deposit/withdrawal and wait for the batch containing it to commit.
+
+        Raises:
+            PermissionError: If the account is not found or not owned by user_id.
+            ValueError: If a withdrawal exceeds the balance.
+
+        Returns:
+            dict: The created transaction (id, account_id, type, amount, created_at).
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            self._start(loop)
+        future = loop.create_future()
+        self._queue.put_nowait((transaction, user_id, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def _start(self, loop: asyncio.AbstractEventLoop):
+        # The writer belongs to the event loop it was started on.
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Apply whatever is still queued, then stop the writer task."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        self._full.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            if self.window > 0 and self._queue.qsize() + 1 < self.max_batch:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch, stopping = [first], False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list):
+        items = [transaction for transaction, _, _ in batch]
+        user_ids = [user_id for _, user_id, _ in batch]
+        GROUP_COMMIT_BATCH.labels().observe(len(batch))
+        try:
+            if database.DB_ASYNC:
+                async with database.AsyncSessionLocal() as db:
+                    outcome = await database.run_sync(
+                        db, crud.create_transactions_batch, items, atomic=False, user_ids=user_ids)
+            else:
+                with database.SessionLocal() as db:
+                    outcome = await database.run_sync(
+                        db, crud.create_transactions_batch, items, atomic=False, user_ids=user_ids)
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, _, future), result in zip(batch, outcome["results"]):
+            if future.done():  # caller went away
+                continue
+            if result["ok"]:
+                future.set_result(result["transaction"])
+            else:
+                future.set_exception(_ERRORS.get(result["error"], ValueError)(result["error"]))
+
+
+writer = GroupCommitWriter()
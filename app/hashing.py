@@ -0,0 +1,125 @@
+"""
+Password hashing service.
+
+bcrypt costs hundreds of milliseconds of CPU per call, so request handlers
+hand hashing and verification to a bounded process pool instead of running
+them on a Starlette worker thread. When too many calls are already waiting,
+new ones are rejected straight away with `HasherOverloaded` (served as a 503)
+rather than queueing up behind a login storm. If a worker process dies
+(e.g. OOM-killed), the broken pool is replaced and the call retried once.
+
+Configuration (environment):
+    BCRYPT_ROUNDS     bcrypt cost factor for new hashes (default 12). Hashes
+                      with a lower cost are upgraded on the next login.
+    HASH_POOL_SIZE    worker processes (default: CPU count); 0 runs bcrypt on
+                      the event loop's default thread pool instead.
+    HASH_QUEUE_LIMIT  maximum calls in flight before rejecting (default 64).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+from .metrics import observe_bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+
+def hash_password(password: str) -> str:
+    """Hash a plaintext password."""
+    return pwd_context.hash(password[:72])
+
+
+def verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify a password and rehash it if the stored hash is outdated.
+
+    Returns:
+        tuple[bool, str | None]: Whether it matched, and a replacement hash
+        when `pwd_context.needs_update` says the stored one should change.
+    """
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class HasherOverloaded(RuntimeError):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """
+    Async front end to a process pool running bcrypt.
+
+    Args:
+        workers (int): Pool size; 0 uses the event loop's default executor.
+        queue_limit (int): Maximum calls in flight (running or waiting).
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._pool = None
+
+    def _executor(self):
+        if self.workers and self._pool is None:
+            # spawn, not fork: the server process has threads running.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _discard(self, pool):
+        """Drop a broken pool, so the next call starts a fresh one."""
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, op: str, fn, *args):
+        if self.pending >= self.queue_limit:
+            raise HasherOverloaded("Password hashing is overloaded, retry shortly")
+        self.pending += 1
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            for _ in range(2):
+                pool = self._executor()
+                try:
+                    return await loop.run_in_executor(pool, fn, *args)
+                except BrokenProcessPool:
+                    # A worker died; hashing is pure, so running it again is safe.
+                    self._discard(pool)
+            raise HasherOverloaded("Password hashing workers are restarting, retry shortly")
+        finally:
+            self.pending -= 1
+            observe_bcrypt(op, time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        """Hash a plaintext password off the event loop."""
+        return await self._submit("hash", hash_password, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Verify a password off the event loop; see `verify_and_update`."""
+        return await self._submit("verify", verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        """Stop the worker processes, if any were started."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+hasher = PasswordHasher(HASH_POOL_SIZE, HASH_QUEUE_LIMIT)
@@ -0,0 +1,261 @@
+"""
+Idempotency keys for the money-moving endpoints.
+
+A client sends ``Idempotency-Key: <unique string>`` with
+POST /transactions/ or POST /transactions/transfer/. The first request with
+a key claims it in `idempotency_keys` and runs. Its result is stored by
+`record` in the same database transaction as the write, so a key is either
+unused or tied to a committed result. A retry with the same key and body
+gets the stored result back without touching any account row. The same key
+with a different body is rejected.
+
+Concurrent duplicates wait for the first request instead of running twice:
+within a process they await the same future, across processes they poll
+the claimed row. A claim that never completed (its process died mid-write,
+so nothing was committed) is taken over once its lease runs out.
+
+Recent results are also kept in `cache.idempotent_results`, so most
+retries are answered without a query. Keys expire after
+IDEMPOTENCY_TTL_SECONDS; purge expired rows from cron:
+
+    python -m app.idempotency
+
+Configuration (environment):
+    IDEMPOTENCY_TTL_SECONDS    how long a key is remembered (default 86400).
+    IDEMPOTENCY_LEASE_SECONDS  how long a claim blocks others before it is
+                               presumed dead (default 30).
+    IDEMPOTENCY_WAIT_SECONDS   how long a duplicate waits for the first
+                               request before giving up with 409 (default 10).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import idempotent_results
+from .database import AnySession, SessionLocal, run_sync
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+POLL_SECONDS = 0.05
+
+
+class IdempotencyConflict(RuntimeError):
+    """Raised when another request holding the same key has not finished."""
+
+
+class Claim(NamedTuple):
+    """A key claimed by the current request; pass it to the crud write."""
+    user_id: int
+    key: str
+    owner: str
+
+
+def fingerprint(path: str, payload: dict) -> str:
+    """Hash of a request's path and body, to tell a retry from a different request."""
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(f"{path}\n{body}".encode()).hexdigest()
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot store {type(value).__name__} in an idempotent result")
+
+
+def claim(db: Session, user_id: int, key: str, request_fingerprint: str) -> tuple[str, str | None]:
+    """
+    Claim a key for this request, or report who has it.
+
+    Returns:
+        tuple[str, str | None]: ("owner", token) if this request should run,
+        ("done", result JSON) if it already ran, or ("busy", None) if
+        another request holding the key is still running.
+
+    Raises:
+        ValueError: If the key was used with a different request.
+    """
+    table = models.IdempotencyKey.__table__
+    now = datetime.utcnow()
+    owner = uuid.uuid4().hex
+    claimed = {"owner": owner, "fingerprint": request_fingerprint, "result": None,
+               "created_at": now, "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}
+    insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+    inserted = db.execute(
+        insert(table).values(user_id=user_id, key=key, **claimed)
+        .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.key])
+    ).rowcount
+    if inserted:
+        db.commit()
+        return "owner", owner
+
+    row = db.execute(
+        select(table.c.fingerprint, table.c.owner, table.c.result, table.c.created_at, table.c.locked_until)
+        .where(table.c.user_id == user_id, table.c.key == key)
+    ).first()
+    db.rollback()
+    if row is None:
+        return "busy", None  # released or purged just now; the caller polls again
+    expired = row.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    if not expired and row.fingerprint != request_fingerprint:
+        raise ValueError("Idempotency-Key was already used for a different request")
+    if not expired and row.result is not None:
+        return "done", row.result
+    if not expired and row.locked_until > now:
+        return "busy", None
+
+    # Expired, or abandoned mid-write: take it over, unless someone else just did.
+    taken = db.execute(
+        update(table)
+        .where(table.c.user_id == user_id, table.c.key == key, table.c.owner == row.owner)
+        .values(**claimed)
+    ).rowcount
+    db.commit()
+    return ("owner", owner) if taken else ("busy", None)
+
+
+def record(db: Session, claimed: Claim, result):
+    """
+    Store a write's result under its key, in the write's transaction (without committing).
+
+    Raises:
+        IdempotencyConflict: If the claim was taken over (its lease ran
+            out); the write is rolled back so it cannot happen twice.
+    """
+    table = models.IdempotencyKey.__table__
+    stored = db.execute(
+        update(table)
+        .where(table.c.user_id == claimed.user_id, table.c.key == claimed.key,
+               table.c.owner == claimed.owner, table.c.result.is_(None))
+        .values(result=json.dumps(result, default=_encode))
+    ).rowcount
+    if not stored:
+        db.rollback()
+        raise IdempotencyConflict("Idempotency-Key was claimed by another request")
+
+
+def release(db: Session, claimed: Claim):
+    """Give a key back after its write failed, so a retry can run."""
+    # The failed write may have left the session mid-transaction or needing
+    # a rollback; discard it first so the DELETE cannot mask the real error.
+    db.rollback()
+    table = models.IdempotencyKey.__table__
+    db.execute(delete(table).where(
+        table.c.user_id == claimed.user_id, table.c.key == claimed.key,
+        table.c.owner == claimed.owner, table.c.result.is_(None),
+    ))
+    db.commit()
+
+
+def purge(db: Session) -> int:
+    """
+    Delete keys older than IDEMPOTENCY_TTL_SECONDS.
+
+    Returns:
+        int: Rows deleted.
+    """
+    table = models.IdempotencyKey.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    deleted = db.execute(delete(table).where(table.c.created_at < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+
+_in_flight: dict[tuple[int, str], asyncio.Future] = {}
+
+
+def _replay(stored: tuple[str, str], request_fingerprint: str):
+    stored_fingerprint, result = stored
+    if stored_fingerprint != request_fingerprint:
+        raise ValueError("Idempotency-Key was already used for a different request")
+    return json.loads(result)
+
+
+async def _run_once(db: AnySession, user_id: int, key: str, request_fingerprint: str, write) -> tuple[tuple, bool]:
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        state, value = await run_sync(db, claim, user_id, key, request_fingerprint)
+        if state == "done":
+            return (request_fingerprint, value), True
+        if state == "owner":
+            break
+        if time.monotonic() > deadline:
+            raise IdempotencyConflict("A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(POLL_SECONDS)
+
+    claimed = Claim(user_id, key, value)
+    try:
+        result = await write(claimed)
+    except Exception:
+        await run_sync(db, release, claimed)
+        raise
+    return (request_fingerprint, json.dumps(result, default=_encode)), False
+
+
+async def execute(db: AnySession, user_id: int, key: str, request_fingerprint: str, write) -> tuple[object, bool]:
+    """
+    Run a write at most once per (user, key) and return its result.
+
+    Args:
+        db (AnySession): Database session.
+        user_id (int): Authenticated user; keys are scoped per user.
+        key (str): The client's Idempotency-Key.
+        request_fingerprint (str): From `fingerprint`.
+        write: Async callable taking the `Claim` and returning the crud
+            result; it must pass the claim on so `record` runs before commit.
+
+    Returns:
+        tuple[object, bool]: The result (as stored, i.e. JSON-decoded) and
+        whether it was replayed rather than produced by this request.
+
+    Raises:
+        ValueError: If the key was used with a different request.
+        IdempotencyConflict: If the first request is still running after
+            IDEMPOTENCY_WAIT_SECONDS.
+    """
+    cache_key = (user_id, key)
+    cached = idempotent_results.get(cache_key)
+    if cached is not None:
+        return _replay(cached, request_fingerprint), True
+    if cache_key in _in_flight:
+        stored, _ = await asyncio.shield(_in_flight[cache_key])
+        return _replay(stored, request_fingerprint), True
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[cache_key] = future
+    try:
+        stored, replayed = await _run_once(db, user_id, key, request_fingerprint, write)
+        future.set_result((stored, replayed))
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # waiters re-raise it; don't warn if there are none
+        raise
+    finally:
+        _in_flight.pop(cache_key, None)
+        if not future.done():
+            future.cancel()
+    idempotent_results.set(cache_key, stored)
+    return _replay(stored, request_fingerprint), replayed
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    with SessionLocal() as db:
+        print({"purged": purge(db)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Bulk import of users (and their first accounts) from CSV or NDJSON.
+
+Rows carry `name`, `email`, `password` and an optional opening `balance`.
+The file is streamed in chunks; each chunk is validated, checked for
+duplicate emails and names with one indexed IN query per column, hashed in
+a process pool, and written in one database transaction: users and
+accounts with executemany, opening balances through the journal
+(`crud.post_journal`), and the import's checkpoint. Hashing of the next
+chunk overlaps with writing the current one, so the pool stays busy.
+
+Rejected rows (invalid, or a duplicate within the file or of an existing
+user) are appended to a rejects CSV with the reason. Progress goes to
+stderr after every chunk.
+
+The checkpoint (`import:<name>` in job_checkpoints, the name defaulting to
+the file's base name) counts the data rows consumed and commits together
+with each chunk, so rerunning the same import after a crash skips what was
+already written.
+
+Usage:
+    python -m app.importer partner-users.csv
+    python -m app.importer users.ndjson --workers 16 --chunk 5000 --rejects rejected.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from multiprocessing import get_context
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+from .database import SessionLocal
+from .hashing import hash_password
+
+CHUNK = 2000
+REJECT_COLUMNS = ("row", "email", "reason")
+
+
+def read_rows(path: str, skip: int = 0):
+    """
+    Yield (row number, fields) for each data row of a CSV or NDJSON file.
+
+    The format follows the extension: .ndjson/.jsonl are read as one JSON
+    object per line, anything else as CSV with a header row.
+
+    Args:
+        path (str): File to read.
+        skip (int): Data rows to skip (already imported).
+    """
+    with open(path, newline="") as source:
+        if path.endswith((".ndjson", ".jsonl")):
+            rows = (json.loads(line) for line in source if line.strip())
+        else:
+            rows = csv.DictReader(source)
+        yield from islice(enumerate(rows, start=1), skip, None)
+
+
+def _validate(fields: dict) -> tuple[schemas.UserCreate, int]:
+    """Return the user and opening balance in minor units, or raise ValueError."""
+    try:
+        user = schemas.UserCreate(name=fields.get("name"), email=fields.get("email"),
+                                  password=fields.get("password"))
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{error['loc'][0]}: {error['msg']}" for error in e.errors()))
+    balance = fields.get("balance")
+    if balance in (None, ""):
+        return user, 0
+    try:
+        return user, crud.to_minor(float(balance))
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"balance: {e}")
+
+
+def _existing(db: Session, column, values: set[str]) -> set[str]:
+    """Values of a unique, indexed column that are already taken."""
+    return set(db.execute(select(column).where(column.in_(values))).scalars()) if values else set()
+
+
+def prepare(db: Session, rows: list[tuple[int, dict]], in_flight: list) -> tuple[list, list]:
+    """
+    Validate a chunk and drop duplicates.
+
+    Args:
+        db (Session): Database session.
+        rows (list[tuple[int, dict]]): (row number, fields) pairs.
+        in_flight (list): Accepted rows of the previous chunk, which is
+            still being written.
+
+    Returns:
+        tuple[list, list]: Accepted (row, user, opening_minor) and rejected
+        (row, email, reason) rows.
+    """
+    accepted, rejected = [], []
+    for number, fields in rows:
+        try:
+            user, opening = _validate(fields)
+        except ValueError as e:
+            rejected.append((number, fields.get("email"), str(e)))
+            continue
+        accepted.append((number, user, opening))
+
+    taken_emails = _existing(db, models.User.email, {user.email for _, user, _ in accepted})
+    taken_names = _existing(db, models.User.name, {user.name for _, user, _ in accepted})
+    taken_emails.update(user.email for _, user, _ in in_flight)
+    taken_names.update(user.name for _, user, _ in in_flight)
+    unique = []
+    for number, user, opening in accepted:
+        if user.email in taken_emails:
+            rejected.append((number, user.email, "Email already registered"))
+        elif user.name in taken_names:
+            rejected.append((number, user.email, "Name already taken"))
+        else:
+            taken_emails.add(user.email)
+            taken_names.add(user.name)
+            unique.append((number, user, opening))
+    return unique, rejected
+
+
+def write(db: Session, accepted: list, password_hashes: list[str], open_accounts: bool) -> int:
+    """
+    Insert a chunk of users, their accounts and opening balances (without committing).
+
+    Returns:
+        int: Users inserted.
+    """
+    if not accepted:
+        return 0
+    users = models.User.__table__
+    db.execute(insert(users), [
+        {"name": user.name, "email": user.email, "password_hash": password_hash}
+        for (_, user, _), password_hash in zip(accepted, password_hashes)
+    ])
+    if not open_accounts:
+        return len(accepted)
+
+    # IDs by email rather than INSERT ... RETURNING, which SQLite can only
+    # do one row at a time when the order has to be kept.
+    emails = [user.email for _, user, _ in accepted]
+    user_ids = dict(db.execute(select(users.c.email, users.c.id).where(users.c.email.in_(emails))).all())
+    now = datetime.utcnow()
+    accounts = models.Account.__table__
+    db.execute(insert(accounts), [
+        {"user_id": user_ids[user.email], "balance_minor": opening, "created_at": now}
+        for _, user, opening in accepted
+    ])
+    account_ids = dict(db.execute(
+        select(accounts.c.user_id, accounts.c.id).where(accounts.c.user_id.in_(user_ids.values()))
+    ).all())
+    postings = [
+        crud._posting(account_ids[user_ids[user.email]], "opening", opening, now)
+        for _, user, opening in accepted if opening
+    ]
+    if postings:
+        crud.post_journal(db, postings)
+    return len(accepted)
+
+
+def run(
+    db: Session,
+    path: str,
+    name: str | None = None,
+    chunk: int = CHUNK,
+    workers: int = os.cpu_count() or 1,
+    rejects: str = "rejects.csv",
+    open_accounts: bool = True,
+) -> dict:
+    """
+    Import a file, resuming after the last committed chunk of the same import.
+
+    Args:
+        db (Session): Database session.
+        path (str): CSV or NDJSON file.
+        name (str | None): Import name for the checkpoint; defaults to the file's base name.
+        chunk (int): Rows per database transaction.
+        workers (int): Hashing processes; 0 hashes in this process.
+        rejects (str): CSV that rejected rows are appended to.
+        open_accounts (bool): Open an account (with the row's opening balance) per user.
+
+    Returns:
+        dict: Rows read, users imported and rows rejected by this invocation, and elapsed time.
+    """
+    checkpoint = f"import:{name or os.path.basename(path)}"
+    saved = crud.get_checkpoint(db, checkpoint)
+    done = json.loads(saved)["rows"] if saved else 0
+    started = time.perf_counter()
+    totals = {"rows": 0, "imported": 0, "rejected": 0}
+
+    pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn")) if workers else None
+    hash_all = (lambda passwords: pool.map(hash_password, passwords, chunksize=16)) if pool else \
+        (lambda passwords: map(hash_password, passwords))
+    fresh = not os.path.exists(rejects)
+    try:
+        with open(rejects, "a", newline="") as out:
+            writer = csv.writer(out)
+            if fresh:
+                writer.writerow(REJECT_COLUMNS)
+
+            def commit(pending):
+                rows, accepted, rejected, hashes = pending
+                totals["imported"] += write(db, accepted, list(hashes), open_accounts)
+                totals["rejected"] += len(rejected)
+                totals["rows"] += len(rows)
+                writer.writerows(rejected)
+                out.flush()
+                os.fsync(out.fileno())
+                crud.set_checkpoint(db, checkpoint, json.dumps({"rows": done + totals["rows"]}))
+                db.commit()
+                elapsed = time.perf_counter() - started
+                print(f"{checkpoint}: {done + totals['rows']} rows, {totals['imported']} imported, "
+                      f"{totals['rejected']} rejected, {totals['rows'] / elapsed:.0f} rows/s", file=sys.stderr)
+
+            source = read_rows(path, skip=done)
+            pending = None
+            while rows := list(islice(source, chunk)):
+                accepted, rejected = prepare(db, rows, pending[1] if pending else [])
+                # Start hashing this chunk before writing the previous one.
+                hashes = hash_all([user.password for _, user, _ in accepted])
+                if pending:
+                    commit(pending)
+                pending = (rows, accepted, rejected, hashes)
+            if pending:
+                commit(pending)
+    finally:
+        if pool:
+            pool.shutdown()
+    return {"import": checkpoint, **totals, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV (with a header row) or .ndjson/.jsonl file")
+    parser.add_argument("--name", help="Import name for resuming (default: the file's base name)")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="Rows per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing processes (0: inline)")
+    parser.add_argument("--rejects", default="rejects.csv", help="CSV that rejected rows are appended to")
+    parser.add_argument("--no-accounts", action="store_true", help="Import users only")
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(run(db, args.path, args.name, args.chunk, args.workers, args.rejects, not args.no_accounts))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,69 @@ Main entry point for LiteBank API.
 Initializes database, creates tables, and registers routers.
 """
 
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
-from .routers import users, accounts, transactions
-from .database import engine
-from . import models
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
+from fastapi_jwt_auth.exceptions import AuthJWTException
+from .routers import auth, users, accounts, transactions
+from .database import async_engine, async_read_engine, engine, pool_status
+from .hashing import HasherOverloaded, hasher
+from .idempotency import IdempotencyConflict
+from .metrics import MetricsMiddleware, render as render_metrics
+from .ratelimit import RateLimitMiddleware
+from . import group_commit, models
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await group_commit.writer.stop()
+    hasher.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if async_read_engine is not None and async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
 
 # Initialize FastAPI app
-app = FastAPI(title="LiteBank API 🏦")
+app = FastAPI(title="LiteBank API 🏦", lifespan=lifespan)
+# Rate limiting sits inside the metrics middleware, so 429s are counted too.
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Shed load quickly when the password hashing pool is saturated
+@app.exception_handler(HasherOverloaded)
+async def hasher_overloaded(request: Request, exc: HasherOverloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Retry of a money-moving request whose first attempt is still running
+@app.exception_handler(IdempotencyConflict)
+async def idempotency_conflict(request: Request, exc: IdempotencyConflict):
+    return JSONResponse(status_code=409, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Missing, malformed or expired bearer tokens
+@app.exception_handler(AuthJWTException)
+async def auth_jwt_error(request: Request, exc: AuthJWTException):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.message})
 
 # Health check endpoint
 @app.get("/healthz")
 def health_check():
     return {"status": "ok"}
 
+# Connection pool occupancy and checkout wait times
+@app.get("/healthz/db")
+def database_health():
+    return pool_status()
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Register API routers
+app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(accounts.router)
 app.include_router(transactions.router)
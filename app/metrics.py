@@ -0,0 +1,248 @@
+"""
+In-process performance metrics, exported in Prometheus text format.
+
+`MetricsMiddleware` times every HTTP request and records its response size.
+SQLAlchemy cursor events add the number of SQL statements and the time spent
+in the database to the current request's tally, which is tracked through a
+context variable so it follows the request onto threadpool workers and the
+async session's greenlets. Observations are a bisect and a few integer
+increments; rendering happens only when /metrics is scraped.
+
+Set LITEBANK_DEBUG=1 to also return a ``Server-Timing`` header with the
+request's DB and total time.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SERVER_TIMING = os.getenv("LITEBANK_DEBUG", "0").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts[i]`` holds observations <= bounds[i]."""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+    def render(self, name: str, labels: str) -> list[str]:
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class HistogramFamily:
+    """Histograms of one metric, keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...], bounds):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.bounds = bounds
+        self.children: dict[tuple, Histogram] = {}
+
+    def labels(self, *values) -> Histogram:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, Histogram(self.bounds))
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self.children.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, values))
+            lines.extend(child.render(self.name, labels))
+        return lines
+
+
+class RequestStats:
+    """Per-request tally of SQL statements and DB time."""
+
+    __slots__ = ("sql_statements", "sql_seconds")
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("litebank_request_stats", default=None)
+
+REQUEST_LATENCY = HistogramFamily(
+    "litebank_http_request_duration_seconds", "HTTP request latency.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = HistogramFamily(
+    "litebank_http_response_size_bytes", "HTTP response body size.",
+    ("method", "route"), SIZE_BUCKETS,
+)
+REQUEST_SQL_STATEMENTS = HistogramFamily(
+    "litebank_db_statements_per_request", "SQL statements executed per HTTP request.",
+    ("method", "route"), COUNT_BUCKETS,
+)
+REQUEST_SQL_SECONDS = HistogramFamily(
+    "litebank_db_seconds_per_request", "Time spent executing SQL per HTTP request.",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+BCRYPT_SECONDS = HistogramFamily(
+    "litebank_bcrypt_seconds", "Password hashing/verification time, including queueing.",
+    ("op",), LATENCY_BUCKETS,
+)
+GROUP_COMMIT_BATCH = HistogramFamily(
+    "litebank_group_commit_batch_size", "Transactions applied per group commit.",
+    (), BATCH_BUCKETS,
+)
+
+in_flight = 0
+
+
+def observe_bcrypt(op: str, seconds: float):
+    """Record the duration of a bcrypt hash or verify call."""
+    BCRYPT_SECONDS.labels(op).observe(seconds)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("litebank_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    starts = conn.info.get("litebank_query_start")
+    if stats is not None and starts:
+        stats.sql_statements += 1
+        stats.sql_seconds += time.perf_counter() - starts.pop()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, size and DB usage per route."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        global in_flight
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    timing = (
+                        f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.sql_statements} queries", '
+                        f"app;dur={elapsed_ms:.2f}"
+                    )
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"server-timing", timing.encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            in_flight -= 1
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            REQUEST_SQL_STATEMENTS.labels(method, route).observe(stats.sql_statements)
+            REQUEST_SQL_SECONDS.labels(method, route).observe(stats.sql_seconds)
+
+
+def _gauge(name: str, help: str, samples: list[tuple[str, float]], kind: str = "gauge") -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}" for labels, value in samples)
+    return lines
+
+
+def render() -> str:
+    """Render every metric in Prometheus text exposition format."""
+    from .database import pool_status
+    from .cache import CACHES, TTLCache
+    from .hashing import hasher
+    from .ratelimit import rejected
+    from .velocity import tracker as velocity
+
+    lines = ["# HELP litebank_http_requests_in_flight HTTP requests being served.",
+             "# TYPE litebank_http_requests_in_flight gauge",
+             f"litebank_http_requests_in_flight {in_flight}"]
+    for family in (REQUEST_LATENCY, RESPONSE_SIZE, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS, BCRYPT_SECONDS,
+                   GROUP_COMMIT_BATCH):
+        lines.extend(family.render())
+    lines.extend(_gauge("litebank_bcrypt_in_flight", "bcrypt calls running or queued.", [("", hasher.pending)]))
+
+    for key, help in (("hits", "Cache lookups that found an entry."),
+                      ("misses", "Cache lookups that found nothing."),
+                      ("evictions", "Entries evicted to stay within the size bound.")):
+        samples = [(f'cache="{cache.name}"', getattr(cache, key)) for cache in CACHES]
+        lines.extend(_gauge(f"litebank_cache_{key}_total", help, samples, "counter"))
+    lines.extend(_gauge("litebank_cache_entries", "Entries held by per-process caches.",
+                        [(f'cache="{cache.name}"', len(cache)) for cache in CACHES if isinstance(cache, TTLCache)]))
+
+    lines.extend(_gauge("litebank_rate_limited_total", "Requests rejected by a rate limit.",
+                        [(f'route="{route}"', count) for route, count in sorted(rejected.items())], "counter"))
+
+    if velocity.limits:
+        lines.extend(_gauge("litebank_velocity_accounts", "Accounts tracked by the velocity limits.",
+                            [("", len(velocity))]))
+        lines.extend(_gauge("litebank_velocity_memory_bytes", "Approximate memory held by velocity tracking.",
+                            [("", len(velocity) * velocity.entry_bytes)]))
+        for key, help in (("hits", "Velocity checks served from memory."),
+                          ("misses", "Velocity checks that loaded the account from the journal."),
+                          ("evictions", "Accounts evicted from velocity tracking."),
+                          ("rejections", "Debits rejected by a velocity limit.")):
+            lines.extend(_gauge(f"litebank_velocity_{key}_total", help, [("", getattr(velocity, key))], "counter"))
+
+    pools = {name: status for name, status in pool_status().items() if "checkouts" in status}
+    for key, help, kind in (
+        ("checked_out", "Connections checked out of the pool.", "gauge"),
+        ("saturation", "Checked-out share of pool capacity.", "gauge"),
+        ("checkouts", "Pool checkouts.", "counter"),
+        ("timeouts", "Pool checkouts that timed out.", "counter"),
+        ("wait_seconds_total", "Time spent waiting for a pooled connection.", "counter"),
+        ("wait_seconds_max", "Longest wait for a pooled connection.", "gauge"),
+    ):
+        name = f"litebank_db_pool_{key}" if kind == "gauge" or key.endswith("_total") else f"litebank_db_pool_{key}_total"
+        samples = [(f'pool="{pool}"', status[key]) for pool, status in pools.items() if status[key] is not None]
+        lines.extend(_gauge(name, help, samples, kind))
+    return "\n".join(lines) + "\n"
@@ -1,29 +1,157 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Date, Integer, String, Text, Float, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 from .database import Base
 
+# Money is stored as integers in 1/MINOR_UNITS of the currency (cents), so
+# balances and the journal add up exactly; the API speaks currency units.
+MINOR_UNITS = 100
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
+    # Bumped with every change to the user's accounts or history; drives ETags.
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")
     accounts = relationship("Account", back_populates="owner")
 
 class Account(Base):
     __tablename__ = "accounts"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    balance = Column(Float, default=0.0)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    balance_minor = Column(BigInteger, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)  # NULL: opened before it was recorded
+    shards = Column(Integer, nullable=False, default=0, server_default="0")  # > 0: hot account, see AccountShard
     owner = relationship("User", back_populates="accounts")
     transactions = relationship("Transaction", back_populates="account")
 
+    @property
+    def balance(self) -> float:
+        """The account row's balance in currency units (a hot account's shards not included)."""
+        return self.balance_minor / MINOR_UNITS
+
 class Transaction(Base):
+    """
+    Journal header: one row per deposit, withdrawal, transfer, opening balance, interest or fee posting.
+
+    On Postgres this table and `journal_entries` are partitioned by month
+    (primary keys include the timestamp; see `partitions`), and months past
+    the retention window live in the archive instead (see `archive`).
+    """
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True, index=True)
-    account_id = Column(Integer, ForeignKey("accounts.id"))
-    type = Column(String)  # deposit, withdraw, transfer
+    account_id = Column(Integer, ForeignKey("accounts.id"))  # source account for transfers; NULL for end-of-day batch postings
+    type = Column(String)  # deposit, withdraw, transfer, opening, interest, fee
     amount = Column(Float)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    created_at = synonym("timestamp")
     account = relationship("Account", back_populates="transactions")
+    entries = relationship("JournalEntry", back_populates="transaction")
+
+    __table_args__ = (
+        Index("ix_transactions_account_timestamp_id", "account_id", "timestamp", "id"),
+    )
+
+class JournalEntry(Base):
+    """
+    One leg of a journal posting, in integer minor units (cents).
+
+    Every transaction's legs sum to zero: a deposit credits the account and
+    debits the outside world (account_id NULL), a transfer debits one account
+    and credits another. Entries are append-only and are what history,
+    statements and reconciliation read.
+    """
+    __tablename__ = "journal_entries"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=False)  # not enforced once partitioned
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=True)
+    kind = Column(String, nullable=False)  # deposit, withdraw, transfer_in, transfer_out, opening, interest, fee
+    amount_minor = Column(BigInteger, nullable=False)  # signed: credits positive, debits negative
+    created_at = Column(DateTime, nullable=False)
+    transaction = relationship("Transaction", back_populates="entries")
+
+    # Few secondary indexes, to keep appends cheap: per-account range scans
+    # newest- or oldest-first, finding a posting's legs, and day-range scans
+    # for batch jobs (BRIN on Postgres, which costs almost nothing to
+    # maintain on an append-only, time-ordered table).
+    __table_args__ = (
+        Index("ix_journal_entries_account_created_id", "account_id", "created_at", "id"),
+        Index("ix_journal_entries_transaction_id", "transaction_id"),
+        Index("ix_journal_entries_created_at", "created_at", postgresql_using="brin"),
+    )
+
+class BalanceSnapshot(Base):
+    """
+    An account's closing balance at the end of a UTC day, in minor units.
+
+    Written by the compaction job in `snapshots` for days with activity only;
+    the balance on any other day is the nearest earlier snapshot.
+    """
+    __tablename__ = "balance_snapshots"
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    balance_minor = Column(BigInteger, nullable=False)
+
+class MonthlyAggregate(Base):
+    """
+    Per-account, per-month, per-kind journal totals (amounts unsigned, minor units).
+
+    Kept current by `crud.post_journal` in the same database transaction as
+    the entries; `python -m app.aggregates` rebuilds it from the journal.
+    Writes to a hot account's shard update their own row (`shard`), so
+    readers sum over shards.
+    """
+    __tablename__ = "monthly_aggregates"
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    kind = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0, server_default="0")  # balance shard of a hot account's writes
+    tx_count = Column(BigInteger, nullable=False, default=0)
+    total_minor = Column(BigInteger, nullable=False, default=0)
+
+class AccountShard(Base):
+    """
+    One slice of a hot account's balance, in minor units.
+
+    A hot account (Account.shards > 0) holds its balance in the account row
+    plus its shard rows, so concurrent deposits update different rows
+    instead of queueing on one row lock (see `shards`). `version` counts
+    the shard's writes and is part of the owner's data version.
+    """
+    __tablename__ = "account_shards"
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # the account's owner
+    balance_minor = Column(BigInteger, nullable=False, default=0)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class JobCheckpoint(Base):
+    """Progress marker for a resumable background job."""
+    __tablename__ = "job_checkpoints"
+    name = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    """
+    A client's Idempotency-Key and the stored result of the request that used it.
+
+    `result` is written in the same database transaction as the money
+    movement, so a completed key always matches a committed write. While
+    the first request is running, `result` is NULL and `owner` identifies
+    it until `locked_until` (see `idempotency`).
+    """
+    __tablename__ = "idempotency_keys"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)  # hash of the request path and body
+    owner = Column(String, nullable=False)
+    result = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, nullable=False)
+    locked_until = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
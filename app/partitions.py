@@ -0,0 +1,347 @@
+"""
+Monthly partitions of the journal tables, and archival of old months.
+
+On Postgres, `transactions` (by timestamp) and `journal_entries` (by
+created_at) are range-partitioned by calendar month: one partition per
+month named ``<table>_pYYYYMM``, plus ``<table>_default`` for rows outside
+them. Vacuum and index maintenance then only touch the months that still
+change, and retiring a month drops a partition instead of deleting rows.
+Rows written for a month before its partition exists land in the default
+partition; `ensure` moves them into the new partition when creating it.
+
+SQLite has no partitioning, so there the journal tables stay single tables:
+`ensure` creates nothing, and a month is retired with range DELETEs on the
+time indexes instead of a partition drop (the space is reused, not returned
+to the OS without a VACUUM). Archival itself works the same on both.
+
+Months older than ARCHIVE_RETENTION_MONTHS are archived: written to
+ARCHIVE_DIR as columnar files (see `archive` for the layout and the
+reader), then dropped from the database. A month is only archived once
+the snapshot job has compacted it, so balance-as-of never needs to replay
+it. Each month is written to a ``.pending`` directory first, dropped from
+the database in one transaction together with the ``archive`` checkpoint,
+and only then renamed into place; a rerun after a crash seals or discards
+pending months according to the checkpoint, so readers never see a month
+both archived and live.
+
+Run it monthly (e.g. from cron); it also creates partitions for the coming
+months:
+
+    python -m app.partitions
+    python -m app.partitions --retention-months 12 --dir /mnt/archive
+
+Configuration (environment):
+    ARCHIVE_RETENTION_MONTHS  whole months kept in the database (default 24).
+    ARCHIVE_DIR               see `archive`.
+"""
+
+import argparse
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from sqlalchemy import delete, exc, func, select, text
+from sqlalchemy.orm import Session
+
+from . import archive, crud, models, snapshots
+from .database import SessionLocal
+
+ARCHIVE_RETENTION_MONTHS = int(os.getenv("ARCHIVE_RETENTION_MONTHS", "24"))
+MONTHS_AHEAD = 3
+CHECKPOINT = "archive"
+BATCH = 50000
+
+# Partitioned table -> its partition key column.
+TABLES = {"transactions": "timestamp", "journal_entries": "created_at"}
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month `count` months after (or before) `month`."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Name of a table's partition for a month, e.g. journal_entries_p202401."""
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(db: Session) -> bool:
+    """Whether the journal tables are partitioned (Postgres after the partitioning migration)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('journal_entries')")).scalar() == "p"
+
+
+def _create_partition(db: Session, table: str, month: date):
+    """
+    Create a table's partition for a month, moving the month's rows out of the default partition.
+
+    Postgres refuses to create a partition while the default partition holds
+    rows in its range, so the default is detached for the move and
+    reattached afterwards, all in the caller's transaction (writers to the
+    table wait on its lock meanwhile).
+    """
+    name, column, default = partition_name(table, month), TABLES[table], f"{table}_default"
+    bounds = {"low": month, "high": add_months(month, 1)}
+    in_range = f'"{column}" >= :low AND "{column}" < :high'
+    create = (f"CREATE TABLE {name} PARTITION OF {table} "
+              f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')")
+    has_default = db.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar() is not None
+    if not has_default or not db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"),
+                                         bounds).scalar():
+        db.execute(text(create))
+        return
+    db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    db.execute(text(create))
+    db.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_range}"), bounds)
+    db.execute(text(f"DELETE FROM {default} WHERE {in_range}"), bounds)
+    db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+
+def ensure(db: Session, months_ahead: int = MONTHS_AHEAD) -> tuple[list[str], dict[str, str]]:
+    """
+    Create any missing partitions from the current month to `months_ahead` months ahead.
+
+    Each partition is committed on its own; one that cannot be created is
+    rolled back and reported, and the others still go ahead.
+
+    Returns:
+        tuple[list[str], dict[str, str]]: Partitions created, and partitions
+        that failed with their errors (both empty unless the tables are
+        partitioned).
+    """
+    if not is_partitioned(db):
+        return [], {}
+    current = datetime.utcnow().date().replace(day=1)
+    created, stuck = [], {}
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        for table in TABLES:
+            name = partition_name(table, month)
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                continue
+            try:
+                _create_partition(db, table, month)
+                db.commit()
+            except exc.DBAPIError as error:
+                db.rollback()
+                stuck[name] = str(error.orig).strip()
+            else:
+                created.append(name)
+    return created, stuck
+
+
+def _fsync(path: str):
+    with open(path, "rb") as written:
+        os.fsync(written.fileno())
+
+
+def _export(db: Session, query, count: int, path: str, table: str, columns: dict, encoded: str) -> list[str]:
+    """
+    Stream a query's rows into one memory-mapped .npy file per column.
+
+    Args:
+        columns (dict): Column name -> dtype, in the query's column order.
+        encoded (str): Column to dictionary-encode (its dtype is the code's).
+
+    Returns:
+        list[str]: The encoded column's dictionary, in code order.
+    """
+    arrays = {name: open_memmap(os.path.join(path, f"{table}.{name}.npy"), mode="w+", dtype=dtype, shape=(count,))
+              for name, dtype in columns.items()}
+    codes: dict[str, int] = {}
+    written = 0
+    for stmt in query:
+        for rows in db.execute(stmt.execution_options(stream_results=True, yield_per=BATCH)).partitions():
+            end = written + len(rows)
+            if end > count:
+                raise RuntimeError(f"{table} changed while it was being archived")
+            for (name, array), values in zip(arrays.items(), zip(*rows)):
+                if name == encoded:
+                    values = [codes.setdefault(value, len(codes)) for value in values]
+                elif name == "account_id":
+                    values = [-1 if value is None else value for value in values]
+                array[written:end] = values
+            written = end
+    if written != count:
+        raise RuntimeError(f"{table} changed while it was being archived")
+    for name, array in arrays.items():
+        array.flush()
+        _fsync(os.path.join(path, f"{table}.{name}.npy"))
+    return list(codes)
+
+
+def _write_month(db: Session, month: date, path: str) -> dict:
+    """Write a month of journal entries and headers into `path`, returning its manifest."""
+    low = datetime.combine(month, datetime.min.time())
+    high = datetime.combine(add_months(month, 1), datetime.min.time())
+    e, t = models.JournalEntry, models.Transaction
+    in_month = (e.created_at >= low, e.created_at < high)
+    entry_count = db.execute(select(func.count()).where(*in_month)).scalar()
+    columns = select(e.id, e.transaction_id, e.account_id, e.kind, e.amount_minor, e.created_at)
+    kinds = _export(db, [
+        # The outside world's legs (account -1) first, then by account: sorted on the account column.
+        columns.where(*in_month, e.account_id.is_(None)).order_by(e.created_at, e.id),
+        columns.where(*in_month, e.account_id.is_not(None)).order_by(e.account_id, e.created_at, e.id),
+    ], entry_count, path, archive.JOURNAL, {
+        "id": np.int64, "transaction_id": np.int64, "account_id": np.int64,
+        "kind": np.uint8, "amount_minor": np.int64, "created_at": "datetime64[us]",
+    }, "kind")
+
+    header_window = (t.timestamp >= low, t.timestamp < high)
+    header_count = db.execute(select(func.count()).where(*header_window)).scalar()
+    types = _export(db, [
+        select(t.id, t.account_id, t.type, t.amount, t.timestamp).where(*header_window).order_by(t.id),
+    ], header_count, path, archive.HEADERS, {
+        "id": np.int64, "account_id": np.int64, "type": np.uint8, "amount": np.float64, "timestamp": "datetime64[us]",
+    }, "type")
+
+    manifest = {
+        "month": f"{month:%Y-%m}", archive.JOURNAL: entry_count, archive.HEADERS: header_count,
+        "kinds": kinds, "types": types, "archived_at": datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as out:
+        json.dump(manifest, out)
+        out.flush()
+        os.fsync(out.fileno())
+    return manifest
+
+
+def drop_month(db: Session, month: date) -> dict[str, int]:
+    """
+    Remove a month from both journal tables (without committing).
+
+    Drops the month's partitions where they exist, then deletes whatever
+    else falls in the month (the default partition's rows, or everything
+    on SQLite).
+
+    Returns:
+        dict[str, int]: Rows removed per table.
+    """
+    low = datetime.combine(month, datetime.min.time())
+    high = datetime.combine(add_months(month, 1), datetime.min.time())
+    partitioned = is_partitioned(db)
+    removed = {}
+    for table, column in reversed(TABLES.items()):  # entries before their headers
+        model = models.JournalEntry if table == archive.JOURNAL else models.Transaction
+        key = getattr(model, column)
+        removed[table] = 0
+        name = partition_name(table, month)
+        if partitioned and db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+            removed[table] = db.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            db.execute(text(f"DROP TABLE {name}"))
+        removed[table] += db.execute(delete(model).where(key >= low, key < high)).rowcount
+    return removed
+
+
+def _fsync_dir(path: str):
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def archive_month(db: Session, month: date, directory: str) -> dict:
+    """
+    Archive one month: write its files, drop it from the database and commit, then seal the files.
+
+    Raises:
+        RuntimeError: If rows of the month changed while it was archived
+            (nothing is dropped then).
+    """
+    final = os.path.join(directory, f"{month:%Y-%m}")
+    staging, pending = final + ".tmp", final + ".pending"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    manifest = _write_month(db, month, staging)
+    os.replace(staging, pending)
+
+    removed = drop_month(db, month)
+    if removed != {archive.JOURNAL: manifest[archive.JOURNAL], archive.HEADERS: manifest[archive.HEADERS]}:
+        db.rollback()
+        shutil.rmtree(pending)
+        raise RuntimeError(f"{month:%Y-%m} changed while it was being archived: wrote {manifest}, found {removed}")
+    crud.set_checkpoint(db, CHECKPOINT, json.dumps({"before": add_months(month, 1).isoformat()}))
+    db.commit()
+    os.replace(pending, final)
+    _fsync_dir(directory)
+    return {"month": manifest["month"], "entries": manifest[archive.JOURNAL], "transactions": manifest[archive.HEADERS]}
+
+
+def _recover(db: Session, directory: str, archived_before: date | None) -> list[str]:
+    """Seal pending months whose drop committed, and discard the rest."""
+    sealed = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(".tmp"):
+            shutil.rmtree(path)
+        elif name.endswith(".pending"):
+            month = date.fromisoformat(name[:-len(".pending")] + "-01")
+            if archived_before is not None and month < archived_before:
+                os.replace(path, path[:-len(".pending")])
+                sealed.append(name[:-len(".pending")])
+            else:
+                shutil.rmtree(path)
+    if sealed:
+        _fsync_dir(directory)
+    return sealed
+
+
+def run(db: Session, retention_months: int = ARCHIVE_RETENTION_MONTHS, directory: str | None = None,
+        months_ahead: int = MONTHS_AHEAD) -> dict:
+    """
+    Create upcoming partitions, then archive every whole month older than the retention window.
+
+    Args:
+        db (Session): Database session.
+        retention_months (int): Whole months to keep in the database, besides the current one.
+        directory (str | None): Archive directory; defaults to ARCHIVE_DIR.
+        months_ahead (int): Months of partitions to create ahead of time.
+
+    Returns:
+        dict: Partitions created (and any that could not be, with the
+        error), months archived (and sealed after a crash), and why
+        archiving stopped, if it did before the retention window.
+    """
+    directory = directory or archive.ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    created, stuck = ensure(db, months_ahead)
+    saved = crud.get_checkpoint(db, CHECKPOINT)
+    archived_before = date.fromisoformat(json.loads(saved)["before"]) if saved else None
+    sealed = _recover(db, directory, archived_before)
+
+    cutoff = add_months(datetime.utcnow().date().replace(day=1), -retention_months)
+    compacted = crud.get_checkpoint(db, snapshots.CHECKPOINT)
+    oldest = db.execute(select(func.min(models.JournalEntry.created_at))).scalar()
+    db.rollback()
+    archived, waiting = [], None
+    month = oldest.date().replace(day=1) if oldest else cutoff
+    while month < cutoff:
+        if compacted is None or date.fromisoformat(compacted) < add_months(month, 1) - timedelta(days=1):
+            waiting = f"balance snapshots not compacted through {month:%Y-%m} (run python -m app.snapshots)"
+            break
+        archived.append(archive_month(db, month, directory))
+        month = add_months(month, 1)
+    return {"partitions_created": created, "partitions_stuck": stuck, "archived": archived, "sealed": sealed,
+            "waiting": waiting}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-months", type=int, default=ARCHIVE_RETENTION_MONTHS,
+                        help="Whole months to keep in the database")
+    parser.add_argument("--dir", help="Archive directory (default: ARCHIVE_DIR)")
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD, help="Partitions to create ahead")
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(run(db, args.retention_months, args.dir, args.months_ahead))
+
+
+if __name__ == "__main__":
+    main()
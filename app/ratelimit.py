@@ -0,0 +1,190 @@
+"""
+Token-bucket rate limiting per client and route, shared across workers.
+
+Each rule gives a route (method and path) a bucket per client: `burst`
+tokens, refilled at `rate` per second, one token per request. A request
+that finds its bucket empty gets a 429 with Retry-After before it reaches
+the router, so a rejection costs a hash and a shared-memory read: no
+token decoding and no database.
+
+Clients are keyed by IP address (``ip``) or by authenticated user
+(``user``). A user is recognised from the token cache (`cache.principals`)
+that `dependencies.get_current_user_id` fills, so a token's first request,
+and any token that never verifies, counts against its IP instead.
+
+Buckets live in a shared-memory table (see `shm`), so every uvicorn worker
+on a host draws from the same bucket. Updates are lock-free and
+best-effort: two workers taking a client's last token at the same instant
+can both succeed, which a rate limit can live with.
+
+Configuration (environment):
+    RATE_LIMITS          rules separated by ";", each
+                         ``METHOD PATH KEY COUNT/SECONDS [BURST]``, e.g.
+                         ``POST /auth/login ip 10/60 10``; a PATH ending in
+                         ``*`` matches a prefix. Empty (the default) turns
+                         limiting off.
+    RATE_LIMIT_SLOTS     buckets in the shared table (default 65536).
+    RATE_LIMIT_FORWARDED 1 to take the client IP from X-Forwarded-For (only
+                         behind a proxy that sets it; default 0).
+
+Behind a reverse proxy or load balancer, every request arrives from the
+proxy's address, so an ``ip`` rule would limit the whole service as one
+client. Set RATE_LIMIT_FORWARDED=1 there (the proxy must overwrite
+X-Forwarded-For, or clients can pick their own key), or use ``user`` rules.
+"""
+
+import math
+import os
+import time
+from typing import NamedTuple
+
+from .cache import SHM_NAME, principals
+from .shm import SharedSlotTable, stable_key
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+RATE_LIMIT_FORWARDED = os.getenv("RATE_LIMIT_FORWARDED", "0").lower() in ("1", "true", "yes")
+
+KEYS = ("ip", "user")
+
+
+class Rule(NamedTuple):
+    """A route's limit: `burst` requests at once, refilled at `rate` per second."""
+    method: str
+    path: str
+    key: str
+    rate: float
+    burst: float
+
+    def matches(self, method: str, path: str) -> bool:
+        if method != self.method:
+            return False
+        if self.path.endswith("*"):
+            return path.startswith(self.path[:-1])
+        return path == self.path
+
+
+def parse_rules(spec: str) -> list[Rule]:
+    """
+    Parse RATE_LIMITS.
+
+    Raises:
+        ValueError: If a rule is malformed.
+    """
+    rules = []
+    for text in filter(None, (part.strip() for part in spec.split(";"))):
+        fields = text.split()
+        if len(fields) not in (4, 5) or fields[2] not in KEYS:
+            raise ValueError(f"Bad rate limit rule {text!r}: expected 'METHOD PATH ip|user COUNT/SECONDS [BURST]'")
+        count, _, seconds = fields[3].partition("/")
+        rate = float(count) / float(seconds or 1)
+        burst = float(fields[4]) if len(fields) == 5 else max(float(count), 1.0)
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Bad rate limit rule {text!r}: rate and burst must be positive")
+        rules.append(Rule(fields[0].upper(), fields[1], fields[2], rate, burst))
+    return rules
+
+
+class TokenBuckets:
+    """
+    Token buckets in a shared-memory table: a slot holds (tokens, last refill).
+
+    A bucket's slot expires once it would have refilled completely, since a
+    missing bucket and a full one are the same.
+    """
+
+    def __init__(self, table: SharedSlotTable):
+        self.table = table
+
+    def take(self, key: int, rate: float, burst: float, now: float | None = None) -> float:
+        """
+        Take a token from a bucket.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available.
+        """
+        now = time.time() if now is None else now
+        found = self.table.get(key, now)
+        if found is None:
+            tokens = burst
+        else:
+            tokens = min(burst, found[0] + max(now - found[1], 0.0) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        tokens -= 1
+        self.table.put(key, tokens, now, now + (burst - tokens) / rate, now)
+        return 0.0
+
+
+def client_ip(scope) -> str:
+    """The client's address, from X-Forwarded-For when RATE_LIMIT_FORWARDED is set."""
+    if RATE_LIMIT_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.split(b",")[0].strip().decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def bearer_token(scope) -> str | None:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token.strip() if scheme.lower() == "bearer" else None
+    return None
+
+
+# Requests rejected per rule path, in this process.
+rejected: dict[str, int] = {}
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware applying the RATE_LIMITS rules.
+
+    Args:
+        app: The wrapped application.
+        rules (list[Rule] | None): Limits to apply; defaults to RATE_LIMITS.
+        buckets (TokenBuckets | None): Bucket storage; defaults to a
+            shared-memory table created on first use.
+    """
+
+    def __init__(self, app, rules: list[Rule] | None = None, buckets: TokenBuckets | None = None):
+        self.app = app
+        self.rules = parse_rules(RATE_LIMITS) if rules is None else rules
+        self.buckets = buckets
+        if self.rules and self.buckets is None:
+            self.buckets = TokenBuckets(SharedSlotTable(f"{SHM_NAME}_ratelimit", RATE_LIMIT_SLOTS))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.rules:
+            return await self.app(scope, receive, send)
+        method, path = scope["method"], scope["path"]
+        for index, rule in enumerate(self.rules):
+            if not rule.matches(method, path):
+                continue
+            client = None
+            if rule.key == "user" and (token := bearer_token(scope)):
+                user_id = principals.get(token)
+                client = f"user:{user_id}" if user_id is not None else None
+            wait = self.buckets.take(stable_key("ratelimit", index, client or f"ip:{client_ip(scope)}"),
+                                     rule.rate, rule.burst)
+            if wait:
+                rejected[rule.path] = rejected.get(rule.path, 0) + 1
+                return await self._reject(send, wait)
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, wait: float):
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
@@ -0,0 +1,156 @@
+"""
+Balance reconciliation: check every account balance (plus a hot account's
+shards) against the journal.
+
+Accounts are split into id-range chunks. Each chunk is reconciled by one
+set-based query (balance vs. the sum of the account's journal entries)
+in a worker process, and only mismatches come back, so memory stays
+bounded however large the journal is. Archived months (see `archive`) are
+added from the archive; a chunk with archived entries is compared in the
+worker instead of in the query. Mismatches are appended to a CSV
+report as chunks finish.
+
+Progress is checkpointed in `job_checkpoints` as the highest account id
+below which every chunk is done. If a run is interrupted, running it
+again with the same --run label (default: today's UTC date) resumes from
+there (chunks that finished after the last checkpoint are checked again,
+so their mismatches may appear twice in the report). A new label, or
+--restart, starts over.
+
+Usage:
+    python -m app.reconcile
+    python -m app.reconcile --workers 8 --chunk 20000 --report reconcile.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import get_context
+
+from sqlalchemy import func, select
+
+from . import archive, crud, models
+from .database import SessionLocal
+
+CHECKPOINT = "reconcile"
+REPORT_COLUMNS = ("account_id", "balance", "expected", "difference")
+
+
+def reconcile_range(lo: int, hi: int) -> tuple[int, list[tuple]]:
+    """
+    Reconcile accounts with lo <= id < hi.
+
+    Runs in a worker process with its own connection pool.
+
+    Returns:
+        tuple[int, list[tuple]]: Accounts checked, and (account_id, balance,
+        expected, difference) for each mismatch.
+    """
+    a, e, s = models.Account, models.JournalEntry, models.AccountShard
+    in_shards = select(func.coalesce(func.sum(s.balance_minor), 0)).where(s.account_id == a.id).scalar_subquery()
+    actual = a.balance_minor + in_shards
+    expected = func.coalesce(func.sum(e.amount_minor), 0)
+    archived = archive.sums(lo, hi)
+    stmt = (
+        select(a.id, actual, expected)
+        .outerjoin(e, e.account_id == a.id)
+        .where(a.id >= lo, a.id < hi)
+        .group_by(a.id, a.balance_minor)
+        .order_by(a.id)
+    )
+    if not archived:
+        stmt = stmt.having(actual != expected)
+    with SessionLocal() as db:
+        checked = db.execute(select(func.count()).where(a.id >= lo, a.id < hi)).scalar()
+        rows = db.execute(stmt).all()
+    mismatches = []
+    for account_id, actual_minor, in_journal in rows:
+        expected_minor = int(in_journal) + archived.get(account_id, 0)
+        if int(actual_minor) != expected_minor:
+            mismatches.append((account_id, int(actual_minor) / crud.MINOR_UNITS, expected_minor / crud.MINOR_UNITS,
+                               (int(actual_minor) - expected_minor) / crud.MINOR_UNITS))
+    return checked, mismatches
+
+
+def run(label: str, chunk: int, workers: int, report: str, restart: bool = False) -> dict:
+    """
+    Reconcile every account, resuming the run called `label` if it was interrupted.
+
+    Args:
+        label (str): Run name; the checkpoint only resumes a run of the same name.
+        chunk (int): Accounts per id-range chunk.
+        workers (int): Worker processes.
+        report (str): CSV path; appended to when resuming.
+        restart (bool): Ignore any checkpoint for this run.
+
+    Returns:
+        dict: Accounts checked, mismatches found and elapsed time.
+    """
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        saved = crud.get_checkpoint(db, CHECKPOINT)
+        lowest, highest = db.execute(select(func.min(models.Account.id), func.max(models.Account.id))).one()
+    state = json.loads(saved) if saved else {}
+    resume = not restart and state.get("run") == label
+    done_below = state["done_below"] if resume else (lowest or 0)
+    if highest is None or done_below > highest:
+        return {"run": label, "checked": 0, "mismatches": 0, "seconds": 0.0}
+
+    ranges = [(lo, min(lo + chunk, highest + 1)) for lo in range(done_below, highest + 1, chunk)]
+    pending, finished = {}, {}
+    checked = mismatches = 0
+    with open(report, "a" if resume else "w", newline="") as out, \
+            ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        writer = csv.writer(out)
+        if not resume:
+            writer.writerow(REPORT_COLUMNS)
+        queue = iter(ranges)
+        for lo, hi in queue:
+            pending[pool.submit(reconcile_range, lo, hi)] = (lo, hi)
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                lo, hi = pending.pop(future)
+                count, rows = future.result()
+                checked += count
+                mismatches += len(rows)
+                writer.writerows(rows)
+                finished[lo] = hi
+                next_range = next(queue, None)
+                if next_range:
+                    pending[pool.submit(reconcile_range, *next_range)] = next_range
+
+            # Advance the checkpoint over chunks finished without gaps.
+            advanced = done_below
+            while advanced in finished:
+                advanced = finished.pop(advanced)
+            if advanced != done_below:
+                done_below = advanced
+                out.flush()
+                os.fsync(out.fileno())
+                with SessionLocal() as db:
+                    crud.set_checkpoint(db, CHECKPOINT, json.dumps({"run": label, "done_below": done_below}))
+                    db.commit()
+    return {"run": label, "checked": checked, "mismatches": mismatches,
+            "seconds": round(time.perf_counter() - started, 2), "report": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--run", default=datetime.utcnow().date().isoformat(), help="Run label (default: today, UTC)")
+    parser.add_argument("--chunk", type=int, default=10000, help="Accounts per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--report", default="reconcile.csv")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+    print(run(args.run, args.chunk, args.workers, args.report, args.restart))
+
+
+if __name__ == "__main__":
+    main()
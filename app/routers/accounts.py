@@ -2,10 +2,14 @@
 API routes for account operations.
 """
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from fastapi_jwt_auth import AuthJWT
-from .. import crud, schemas, database, models
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from .. import crud, crud_async, etags, schemas, database
+from ..dependencies import get_current_user_id, get_routed_session, pins_reads
+from ..statements import MEDIA_TYPES, StatementEncoder, StatementFormat, accepts_gzip
 
 router = APIRouter(
     prefix="/accounts",
@@ -13,20 +17,9 @@ router = APIRouter(
 )
 
 
-def get_db():
-    """
-    Provide a database session dependency.
-    """
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-@router.post("/", response_model=schemas.Account)
-def create_account(account: schemas.AccountCreate, db: Session = Depends(get_db),
-                   Authorize: AuthJWT = Depends()):
+@router.post("/", response_model=schemas.Account, dependencies=[Depends(pins_reads, scope="function")])
+async def create_account(account: schemas.AccountCreate, db: database.AnySession = Depends(database.get_session),
+                         current_user_id: int = Depends(get_current_user_id)):
     """
     Create a new account for the authenticated user.
 
@@ -34,29 +27,149 @@ def create_account(account: schemas.AccountCreate, db: Session = Depends(get_db)
         account (schemas.AccountCreate): Account creation details.
         db (Session): Database session (injected).
 
+    Raises:
+        HTTPException: If the balance is out of range or has fractions of a cent.
+
     Returns:
         schemas.Account: The created account.
     """
-    Authorize.jwt_required()
-    current_user_id = Authorize.get_jwt_subject()
-
     # Force ownership
     account.user_id = current_user_id
 
-    return crud.create_account(db=db, account=account)
+    try:
+        return await crud_async.create_account(db, account=account)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/", response_model=list[schemas.Account])
-def read_accounts(db: Session = Depends(get_db), Authorize: AuthJWT = Depends()):
+async def read_accounts(request: Request, db: database.AnySession = Depends(get_routed_session),
+                        current_user_id: int = Depends(get_current_user_id)):
     """
     Retrieve all accounts belonging to the authenticated user.
 
+    Responses carry an ETag; send it back in If-None-Match to get a 304
+    when nothing changed (see `etags`).
+
     Args:
+        request (Request): Incoming request, for If-None-Match.
         db (Session): Database session (injected).
 
     Returns:
         list[schemas.Account]: List of accounts.
     """
-    Authorize.jwt_required()
-    current_user_id = int(Authorize.get_jwt_subject())
-    return crud.get_accounts(db, user_id=current_user_id)
+    version = await crud_async.get_data_version(db, current_user_id)
+    tag = etags.etag(request, "accounts", current_user_id, version)
+    if (unchanged := etags.not_modified(request, tag)) is not None:
+        return unchanged
+    # Rows come back as plain dicts already in schema shape; returning the
+    # response directly skips per-row pydantic validation.
+    return ORJSONResponse(await crud_async.get_accounts(db, user_id=current_user_id), headers=etags.headers(tag))
+
+
+@router.get("/{account_id}/balance", response_model=schemas.AccountBalance)
+async def read_balance(
+    account_id: int,
+    as_of: Optional[datetime] = None,
+    db: database.AnySession = Depends(get_routed_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Return an account's balance now or at a past point in time.
+
+    Args:
+        account_id (int): Account to report on.
+        as_of (datetime | None): Point in time (UTC if no offset); defaults to now.
+
+    Returns:
+        schemas.AccountBalance: The balance from entries created before `as_of`.
+    """
+    if await crud_async.get_account_owner(db, account_id) != current_user_id:
+        raise HTTPException(status_code=403, detail="Unauthorized access to this account")
+    as_of = as_of or datetime.utcnow()
+    balance = await crud_async.get_balance_as_of(db, account_id, as_of)
+    return {"account_id": account_id, "as_of": as_of, "balance": balance}
+
+
+@router.get("/{account_id}/summary", response_model=schemas.AccountSummary)
+async def read_account_summary(
+    account_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: database.AnySession = Depends(get_routed_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Summarize an account's deposits, withdrawals and transfers by whole months.
+
+    Args:
+        account_id (int): Account to summarize.
+        start (date | None): Any day in the first month to include.
+        end (date | None): Any day in the last month to include.
+
+    Returns:
+        schemas.AccountSummary: Count, total and average per kind.
+    """
+    if await crud_async.get_account_owner(db, account_id) != current_user_id:
+        raise HTTPException(status_code=403, detail="Unauthorized access to this account")
+    summary = await crud_async.get_summary(db, account_id=account_id, start=start, end=end)
+    return {"account_id": account_id, "start": start and start.replace(day=1),
+            "end": end and end.replace(day=1), **summary}
+
+
+@router.get("/{account_id}/statement")
+async def read_statement(
+    account_id: int,
+    request: Request,
+    format: StatementFormat = StatementFormat.CSV,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: database.AnySession = Depends(get_routed_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Stream an account's full transaction history as CSV or NDJSON, oldest first.
+
+    Rows are read through a server-side cursor in fixed-size batches and
+    written out as they arrive, so memory stays flat however long the
+    history is. The body is gzipped when the client accepts it.
+
+    Args:
+        account_id (int): Account to export.
+        format (StatementFormat): csv or ndjson.
+        start (datetime | None): Inclusive lower bound on the timestamp.
+        end (datetime | None): Exclusive upper bound on the timestamp.
+
+    Returns:
+        StreamingResponse: The statement.
+    """
+    if await crud_async.get_account_owner(db, account_id) != current_user_id:
+        raise HTTPException(status_code=403, detail="Unauthorized access to this account")
+
+    gzip = accepts_gzip(request.headers.get("accept-encoding", ""))
+    encoder = StatementEncoder(format, gzip=gzip)
+
+    # The body outlives this handler's session, so it streams from its own.
+    if database.DB_ASYNC:
+        async def body():
+            async with database.open_read_session(current_user_id) as session:
+                yield encoder.start()
+                async for rows in crud_async.iter_statement(session, account_id, start, end):
+                    yield encoder.rows(rows)
+                yield encoder.finish()
+    else:
+        def body():
+            with database.open_read_session(current_user_id) as session:
+                yield encoder.start()
+                for rows in crud.iter_statement(session, account_id, start, end):
+                    yield encoder.rows(rows)
+                yield encoder.finish()
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="statement-{account_id}.{format.value}"',
+        # The body depends on Accept-Encoding, so caches must key on it.
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format], headers=headers)
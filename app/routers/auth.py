@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi_jwt_auth import AuthJWT
-from sqlalchemy.orm import Session
-from .. import schemas, crud, database
-from fastapi_jwt_auth.exceptions import AuthJWTException
+from .. import schemas, crud_async, database
+from ..dependencies import get_current_user_id, get_routed_session
+from ..hashing import hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post("/signup", response_model=schemas.UserResponse)
-def signup(user: schemas.UserCreate, db: Session = Depends(database.SessionLocal)) -> schemas.UserResponse:
+@router.post("/signup", response_model=schemas.User)
+async def signup(user: schemas.UserCreate, db: database.AnySession = Depends(database.get_session)) -> schemas.User:
     """Register a new user account.
 
     Args:
@@ -19,19 +19,26 @@ def signup(user: schemas.UserCreate, db: Session = Depends(database.SessionLocal
         HTTPException: If the email is already registered.
 
     Returns:
-        schemas.UserResponse: The newly created user data.
+        schemas.User: The newly created user data.
     """
-    existing = db.query(crud.models.User).filter(crud.models.User.email == user.email).first()
+    existing = await crud_async.get_user_by_email(db, user.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db, user)
+    password_hash = await hasher.hash(user.password)
+    created = await crud_async.create_user(db, user, password_hash)
+    # The new user's first reads (e.g. /auth/me) must not miss them on a lagging replica.
+    database.pin_to_primary(created.id)
+    return created
 
 
 @router.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(database.SessionLocal),
+async def login(user: schemas.UserLogin, db: database.AnySession = Depends(database.get_session),
     Authorize: AuthJWT = Depends()) -> dict[str, str]:
     """Authenticate a user and return a JWT access token.
 
+    Password verification runs in the hashing pool; if the stored hash uses
+    an outdated bcrypt cost it is transparently replaced.
+
     Args:
         user (schemas.UserLogin): User login credentials.
         db (Session): SQLAlchemy database session dependency.
@@ -43,29 +50,41 @@ def login(user: schemas.UserLogin, db: Session = Depends(database.SessionLocal),
     Returns:
         dict[str, str]: Access token and token type.
     """
-    db_user = crud.authenticate_user(db, user.email, user.password)
+    db_user = await crud_async.get_user_by_email(db, user.email)
     if not db_user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    verified, new_hash = await hasher.verify_and_update(user.password, db_user.password_hash)
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        await crud_async.update_password_hash(db, db_user.id, new_hash)
+        database.pin_to_primary(db_user.id)
 
     access_token = Authorize.create_access_token(subject=db_user.id)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@router.get("/me", response_model=schemas.UserResponse)
-def get_me(Authorize: AuthJWT = Depends(), db: Session = Depends(database.SessionLocal)) -> schemas.UserResponse:
+@router.get("/me", response_model=schemas.User)
+async def get_me(current_user_id: int = Depends(get_current_user_id),
+                 db: database.AnySession = Depends(get_routed_session)) -> schemas.User:
     """Retrieve the currently authenticated user's details.
 
+    The profile is served from the user cache when possible.
+
     Args:
-        Authorize (AuthJWT): JWT authorization dependency.
+        current_user_id (int): Authenticated user's ID (injected).
         db (Session): SQLAlchemy database session dependency.
 
+    Raises:
+        HTTPException: If the user no longer exists.
+
     Returns:
-        schemas.UserResponse: The authenticated user's data.
+        schemas.User: The authenticated user's data.
     """
-    Authorize.jwt_required()
-    current_user_id = Authorize.get_jwt_subject()
-    user = db.query(crud.models.User).filter(crud.models.User.id == current_user_id).first()
-    return user
+    profile = await crud_async.get_user_profile(db, current_user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profile
 
 
 class Settings(schemas.BaseModel):
@@ -2,50 +2,86 @@
 API routes for transaction operations (deposit, withdraw, transfer).
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from fastapi_jwt_auth import AuthJWT
-from .. import crud, schemas, database, models
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from .. import crud_async, etags, idempotency, schemas, database
+from ..cache import hot_accounts
+from ..dependencies import get_current_user_id, get_routed_session, pins_reads
+from ..group_commit import GROUP_COMMIT, writer
 
 router = APIRouter(
     prefix="/transactions",
     tags=["transactions"],
 )
 
-def get_db():
-    """
-    Provide a database session dependency.
+@router.get("/", response_model=schemas.TransactionPage)
+async def read_transactions(
+    request: Request,
+    account_id: Optional[int] = None,
+    type: Optional[schemas.EntryKind] = None,
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: database.AnySession = Depends(get_routed_session),
+    current_user_id: int = Depends(get_current_user_id)
+):
     """
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    Retrieve a page of transactions belonging to the authenticated user, newest first.
+
+    Responses carry an ETag; send it back in If-None-Match to get a 304
+    when nothing changed (see `etags`).
 
-@router.get("/", response_model=list[schemas.Transaction])
-def read_transactions(db: Session = Depends(get_db), Authorize: AuthJWT = Depends()):
-    """
-    Retrieve all transactions belonging to the authenticated user.
     Args:
+        request (Request): Incoming request, for If-None-Match.
+        account_id, type, min_amount, max_amount, start, end: Optional filters.
+        after (str | None): Cursor from a previous page's next_cursor.
+        before (str | None): Cursor from a previous page's prev_cursor.
+        limit (int): Page size.
         db (Session): Database session (injected).
-        Authorize (AuthJWT): JWT authorization dependency.
+        current_user_id (int): Authenticated user's ID (injected).
     Returns:
-        list[schemas.Transaction]: List of transactions.
+        schemas.TransactionPage: Transactions plus cursors to neighbouring pages.
     """
-    Authorize.jwt_required()
-    current_user_id = Authorize.get_jwt_subject()
-    return crud.get_transactions(db, user_id=int(current_user_id))
-
-@router.post("/", response_model=schemas.Transaction)
-def create_transaction(transaction: schemas.TransactionCreate, db: Session = Depends(get_db),
-                       Authorize: AuthJWT = Depends()):
+    version = await crud_async.get_data_version(db, current_user_id)
+    tag = etags.etag(request, "transactions", current_user_id, version)
+    if (unchanged := etags.not_modified(request, tag)) is not None:
+        return unchanged
+    try:
+        page = await crud_async.get_transactions(
+            db, user_id=current_user_id, account_id=account_id, type=type,
+            min_amount=min_amount, max_amount=max_amount, start=start, end=end,
+            after=after, before=before, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The page is already in schema shape; skip per-row pydantic validation.
+    return ORJSONResponse(page, headers=etags.headers(tag))
+
+@router.post("/", response_model=schemas.Transaction, dependencies=[Depends(pins_reads, scope="function")])
+async def create_transaction(transaction: schemas.TransactionCreate, response: Response,
+                       idempotency_key: Optional[str] = Header(None, max_length=255),
+                       db: database.AnySession = Depends(database.get_session),
+                       current_user_id: int = Depends(get_current_user_id)):
     """
     Create a transaction (deposit or withdraw).
 
+    With GROUP_COMMIT enabled the write is queued and committed together
+    with other requests' writes (see `group_commit`). Requests carrying an
+    Idempotency-Key are written directly, at most once per key (see
+    `idempotency`); a replayed result has the Idempotent-Replayed header.
+
     Args:
         transaction (schemas.TransactionCreate): Transaction details.
+        idempotency_key (str | None): Client-chosen key making retries safe.
         db (Session): Database session (injected).
-        Authorize (AuthJWT): JWT authorization dependency.
+        current_user_id (int): Authenticated user's ID (injected).
 
     Returns:
         schemas.Transaction: The created transaction.
@@ -53,33 +89,65 @@ def create_transaction(transaction: schemas.TransactionCreate, db: Session = Dep
     Raises:
         HTTPException: If withdrawal fails or type is invalid.
     """
-    Authorize.jwt_required()
-    current_user_id = int(Authorize.get_jwt_subject())
-
-    # Verify the account belongs to this user
-    account = db.query(models.Account).filter(models.Account.id == transaction.account_id).first()
-    if not account or account.user_id != current_user_id:
-        raise HTTPException(status_code=403, detail="Unauthorized access to this account")
-
     try:
-        return crud.create_transaction(db=db, transaction=transaction)
+        if idempotency_key:
+            result, replayed = await idempotency.execute(
+                db, current_user_id, idempotency_key,
+                idempotency.fingerprint("POST /transactions/", transaction.dict()),
+                lambda claim: crud_async.create_transaction(
+                    db, transaction=transaction, user_id=current_user_id, idempotency=claim,
+                ),
+            )
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+            return result
+        # Hot accounts take concurrent writes on their shards (see `shards`);
+        # group commit would lock the account row for the whole batch.
+        if GROUP_COMMIT and not hot_accounts.get(transaction.account_id):
+            return await writer.submit(transaction, current_user_id)
+        return await crud_async.create_transaction(db, transaction=transaction, user_id=current_user_id)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/transfer/", response_model=schemas.TransferResponse)
-def transfer_funds(
+@router.post("/batch", response_model=schemas.TransactionBatchResult, dependencies=[Depends(pins_reads, scope="function")])
+async def create_transactions_batch(batch: schemas.TransactionBatch, db: database.AnySession = Depends(database.get_session),
+                              current_user_id: int = Depends(get_current_user_id)):
+    """
+    Apply many deposits/withdrawals in one request and one DB transaction.
+
+    Args:
+        batch (schemas.TransactionBatch): Items to apply and the batch mode.
+        db (Session): Database session (injected).
+        current_user_id (int): Authenticated user's ID (injected).
+
+    Returns:
+        schemas.TransactionBatchResult: Per-item results in submission order.
+    """
+    return await crud_async.create_transactions_batch(
+        db, batch.items, user_id=current_user_id, atomic=batch.mode == schemas.BatchMode.ATOMIC,
+    )
+
+
+@router.post("/transfer/", response_model=schemas.TransferResponse, dependencies=[Depends(pins_reads, scope="function")])
+async def transfer_funds(
     transfer: schemas.TransferCreate,
-    db: Session = Depends(get_db),
-    Authorize: AuthJWT = Depends()
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: database.AnySession = Depends(database.get_session),
+    current_user_id: int = Depends(get_current_user_id)
 ):
     """
     Transfer funds between two accounts owned by the authenticated user
 
     Args:
         transfer (schemas.TransferCreate): JSON body with from_account_id, to_account_id, and amount.
+        idempotency_key (str | None): Client-chosen key making retries safe
+            (see `create_transaction`).
         db (Session): Database session (injected).
-        Authorize (AuthJWT): JWT authorization dependency.
+        current_user_id (int): Authenticated user's ID (injected).
 
     Returns:
         dict: Transfer confirmation message and balances.
@@ -87,30 +155,26 @@ def transfer_funds(
     Raises:
         HTTPException: If insufficient funds or accounts are invalid.
     """
-    Authorize.jwt_required()
-    current_user_id = int(Authorize.get_jwt_subject())
-
-    source = db.query(models.Account).filter(models.Account.id == transfer.from_account_id).first()
-    target = db.query(models.Account).filter(models.Account.id == transfer.to_account_id).first()
-
-    if not source or not target:
-        raise HTTPException(status_code=404, detail="One or both accounts not found")
-
-    if source.user_id != current_user_id or target.user_id != current_user_id:
-        raise HTTPException(status_code=403, detail="Unauthorized transfer")
-
-    if source.balance < transfer.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-
-    # Withdraw from source account
-    source.balance -= transfer.amount
-    # Deposit into target account
-    target.balance += transfer.amount
-    db.commit()
+    try:
+        if idempotency_key:
+            (from_balance, to_balance), replayed = await idempotency.execute(
+                db, current_user_id, idempotency_key,
+                idempotency.fingerprint("POST /transactions/transfer/", transfer.dict()),
+                lambda claim: crud_async.transfer_funds(db, transfer, user_id=current_user_id, idempotency=claim),
+            )
+            if replayed:
+                response.headers["Idempotent-Replayed"] = "true"
+        else:
+            from_balance, to_balance = await crud_async.transfer_funds(db, transfer, user_id=current_user_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         "message": f"Transferred {transfer.amount} from account {transfer.from_account_id} to {transfer.to_account_id}.",
-        "from_account_balance": source.balance,
-        "to_account_balance": target.balance,
+        "from_account_balance": from_balance,
+        "to_account_balance": to_balance,
     }
-
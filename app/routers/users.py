@@ -2,38 +2,53 @@
 API routes for user operations.
 """
 
+from datetime import date
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import crud, schemas, database
+from .. import crud_async, schemas, database
+from ..dependencies import get_current_user_id, get_routed_session
+from ..hashing import hasher
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
 )
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: database.AnySession = Depends(database.get_session)):
     """
     Create a new user.
     """
     # Check if email already exists
-    users = crud.get_users(db)
-    for u in users:
-        if u.email == user.email:
-            raise HTTPException(status_code=400, detail="Email already registered")
+    if await crud_async.get_user_by_email(db, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
 
-    return crud.create_user(db=db, user=user)
+    password_hash = await hasher.hash(user.password)
+    created = await crud_async.create_user(db, user, password_hash)
+    database.pin_to_primary(created.id)
+    return created
 
 @router.get("/", response_model=list[schemas.User])
-def read_users(db: Session = Depends(get_db)):
+async def read_users(db: database.AnySession = Depends(database.get_read_session)):
     """
     Retrieve all users.
     """
-    return crud.get_users(db)
+    return await crud_async.get_users(db)
+
+@router.get("/me/summary", response_model=schemas.UserSummary)
+async def read_user_summary(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: database.AnySession = Depends(get_routed_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Summarize money movements across all of the authenticated user's accounts.
+
+    Transfers between the user's own accounts count as both a transfer_out
+    and a transfer_in.
+    """
+    summary = await crud_async.get_summary(db, user_id=current_user_id, start=start, end=end)
+    return {"user_id": current_user_id, "start": start and start.replace(day=1),
+            "end": end and end.replace(day=1), **summary}
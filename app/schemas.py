@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, conlist
+from datetime import date, datetime
 from typing import Optional
 from enum import Enum
 
@@ -55,12 +55,57 @@ class Account(AccountBase):
     class Config:
         orm_mode = True
 
+class AccountBalance(BaseModel):
+    """
+    Schema for an account's balance at a point in time.
+    """
+    account_id: int
+    as_of: datetime
+    balance: float
+
+class FlowSummary(BaseModel):
+    """ Count, total and average amount of one kind of money movement. """
+    count: int
+    total: float
+    average: float
+
+class Summary(BaseModel):
+    """
+    Schema for money movements per kind over a range of whole months.
+    start and end are the first and last months included (None = open-ended).
+    """
+    start: Optional[date] = None
+    end: Optional[date] = None
+    deposit: FlowSummary
+    withdraw: FlowSummary
+    transfer_in: FlowSummary
+    transfer_out: FlowSummary
+    opening: FlowSummary
+    interest: FlowSummary
+    fee: FlowSummary
+
+class AccountSummary(Summary):
+    account_id: int
+
+class UserSummary(Summary):
+    user_id: int
+
 # --- Transaction Schemas---
 
 class TransactionType(str, Enum):
     DEPOSIT = "deposit"
     WITHDRAW = "withdraw"
 
+class EntryKind(str, Enum):
+    """ How a journal entry moved money on an account. """
+    DEPOSIT = "deposit"
+    WITHDRAW = "withdraw"
+    TRANSFER_IN = "transfer_in"
+    TRANSFER_OUT = "transfer_out"
+    OPENING = "opening"
+    INTEREST = "interest"
+    FEE = "fee"
+
 class TransactionBase(BaseModel):
     """
     Base schema for a transaction, such as a deposit or withdrawal.
@@ -80,7 +125,9 @@ class Transaction(TransactionBase):
     """
     Schema for returning transaction data with database metadata.
     Includes transaction ID, associated account ID, and created_at.
+    In history, a transfer appears once on each account it touched.
     """
+    type: EntryKind
     id: int
     account_id: int
     created_at: datetime
@@ -88,6 +135,43 @@ class Transaction(TransactionBase):
     class Config:
         orm_mode = True
 
+class TransactionPage(BaseModel):
+    """
+    Schema for one page of transaction history.
+    Cursors are opaque; pass next_cursor as `after` to fetch older
+    transactions and prev_cursor as `before` to fetch newer ones.
+    """
+    items: list[Transaction]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+class BatchMode(str, Enum):
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best_effort"
+
+class TransactionBatch(BaseModel):
+    """
+    Schema for submitting many deposits/withdrawals in one request.
+    In atomic mode nothing is applied unless every item succeeds; in
+    best_effort mode valid items are applied and failures are reported.
+    """
+    items: conlist(TransactionCreate, min_items=1, max_items=10000)
+    mode: BatchMode = BatchMode.ATOMIC
+
+class BatchItemResult(BaseModel):
+    """ Outcome of one batch item, in submission order. """
+    index: int
+    ok: bool
+    transaction: Optional[Transaction] = None
+    error: Optional[str] = None
+
+class TransactionBatchResult(BaseModel):
+    """ Schema for batch response details. """
+    committed: bool
+    succeeded: int
+    failed: int
+    results: list[BatchItemResult]
+
 # --- Transfer Schema---
 
 class TransferCreate(BaseModel):
@@ -0,0 +1,148 @@
+"""
+Hot accounts: balances split across shard rows.
+
+An account that takes hundreds of writes per second (a merchant settlement
+account, a payroll source) serializes them all on its row lock. Making it
+hot spreads its balance over N `account_shards` rows: the balance is the
+account row plus the shards. Deposits go to a random shard; withdrawals
+take from one shard that can cover them, or sweep all shards into the
+account row and withdraw from there (see `crud.create_transaction`).
+Transfers, batches and end-of-day read or sweep the shards under the
+account's lock, and GET /accounts/ returns the sum.
+
+Shard balances drift: deposit-heavy accounts pile up in the shards, and
+withdrawal-heavy ones drain them and fall back to the account row. The
+consolidation job moves shard balances back into the account row, or with
+--spread splits the whole balance evenly across the shards so that
+withdrawals can be served by them:
+
+    python -m app.shards consolidate            # e.g. every minute from cron
+    python -m app.shards consolidate --spread
+
+Turning it on or off (0 shards) is an operator action:
+
+    python -m app.shards set 42 --shards 16
+    python -m app.shards set 42 --shards 0
+"""
+
+import argparse
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .cache import invalidate_account
+from .database import SessionLocal
+
+MAX_SHARDS = 256
+
+
+def set_shards(db: Session, account_id: int, shards: int) -> dict:
+    """
+    Make an account hot with `shards` balance shards, resize it, or (0) make it ordinary again.
+
+    The whole balance is swept into the account row first, so no money
+    sits in a shard that goes away. Write counts of removed shards move to
+    the owner's data_version, so the data version never goes backwards.
+
+    Args:
+        db (Session): Database session.
+        account_id (int): Account to change.
+        shards (int): New number of shards, 0 to MAX_SHARDS.
+
+    Raises:
+        ValueError: If `shards` is out of range.
+        LookupError: If the account does not exist.
+
+    Returns:
+        dict: The account, its old and new shard counts and its balance.
+    """
+    if not 0 <= shards <= MAX_SHARDS:
+        raise ValueError(f"Shards must be between 0 and {MAX_SHARDS}")
+    a, s = models.Account, models.AccountShard
+    row = db.execute(select(a.user_id, a.shards).where(a.id == account_id).with_for_update()).first()
+    if row is None:
+        db.rollback()
+        raise LookupError("Account not found")
+
+    crud.sweep_shards(db, [account_id])
+    removed = db.execute(
+        select(s.version).where(s.account_id == account_id, s.shard >= shards).with_for_update()
+    ).scalars().all()
+    if removed:
+        db.execute(delete(s).where(s.account_id == account_id, s.shard >= shards))
+        users = models.User.__table__
+        db.execute(update(users).where(users.c.id == row.user_id)
+                   .values(data_version=users.c.data_version + sum(removed)))
+    existing = db.execute(select(s.shard).where(s.account_id == account_id)).scalars().all()
+    missing = sorted(set(range(shards)) - set(existing))
+    if missing:
+        db.execute(insert(s.__table__), [
+            {"account_id": account_id, "shard": shard, "user_id": row.user_id, "balance_minor": 0, "version": 0}
+            for shard in missing
+        ])
+    db.execute(update(a).where(a.id == account_id).values(shards=shards))
+    balance = db.execute(select(a.balance_minor).where(a.id == account_id)).scalar() / crud.MINOR_UNITS
+    db.commit()
+    invalidate_account(account_id)
+    return {"account_id": account_id, "was": row.shards, "shards": shards, "balance": balance}
+
+
+def consolidate_account(db: Session, account_id: int, spread: bool = False) -> float:
+    """
+    Sweep one hot account's shards into its row and commit, optionally re-spreading the balance.
+
+    With `spread`, the balance is then split evenly across the shards (any
+    remainder of cents stays in the account row). The total never changes,
+    so the owner's data version is left alone.
+
+    Returns:
+        float: The amount moved out of the shards.
+    """
+    a, s = models.Account, models.AccountShard
+    row = db.execute(select(a.balance_minor, a.shards).where(a.id == account_id).with_for_update()).first()
+    if row is None or not row.shards:
+        db.rollback()
+        return 0.0
+    moved = crud.sweep_shards(db, [account_id]).get(account_id, 0)
+    total = row.balance_minor + moved
+    if spread and total > 0:
+        each = total // row.shards
+        db.execute(update(s).where(s.account_id == account_id).values(balance_minor=each))
+        db.execute(update(a).where(a.id == account_id).values(balance_minor=total - each * row.shards))
+    db.commit()
+    return moved / crud.MINOR_UNITS
+
+
+def consolidate(db: Session, spread: bool = False) -> dict:
+    """
+    Consolidate every hot account, one database transaction each.
+
+    Returns:
+        dict: Hot accounts processed and the total moved out of shards.
+    """
+    a = models.Account
+    account_ids = db.execute(select(a.id).where(a.shards > 0).order_by(a.id)).scalars().all()
+    db.rollback()
+    moved = sum(consolidate_account(db, account_id, spread) for account_id in account_ids)
+    return {"accounts": len(account_ids), "moved": round(moved, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge = commands.add_parser("consolidate", help="Sweep shard balances into their account rows")
+    merge.add_argument("--spread", action="store_true", help="Then split each balance evenly across the shards")
+    change = commands.add_parser("set", help="Set an account's number of shards (0: not hot)")
+    change.add_argument("account_id", type=int)
+    change.add_argument("--shards", type=int, required=True)
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        if args.command == "consolidate":
+            print(consolidate(db, args.spread))
+        else:
+            print(set_shards(db, args.account_id, args.shards))
+
+
+if __name__ == "__main__":
+    main()
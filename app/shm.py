@@ -0,0 +1,124 @@
+"""
+Fixed-size hash table in a named shared-memory segment.
+
+Lets uvicorn worker processes on one host share small numeric state (cached
+lookups, rate-limit buckets) without an external service. Each slot holds a
+64-bit key, two float64 values and an expiry time. Readers never take a
+lock: every slot carries a sequence number that writers make odd while they
+update it, and a reader that sees it odd or changed retries. Two processes
+writing the same slot at the same instant can still interleave, so values
+are best-effort; the consumers here only store data that is safe to lose
+or to have slightly stale.
+
+The segment is created by the first process to need it and attached by the
+rest. It is deliberately left in place when processes exit so restarting
+workers keep sharing it.
+"""
+
+import hashlib
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+_SEQ = struct.Struct("<Q")
+_BODY = struct.Struct("<Qddd")  # key, a, b, expires
+SLOT_SIZE = _SEQ.size + _BODY.size
+PROBES = 8
+
+
+def stable_key(*parts) -> int:
+    """Hash parts into a non-zero 64-bit key that is the same in every process."""
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | 1
+
+
+def _attach(name: str, size: int) -> shared_memory.SharedMemory:
+    try:
+        segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        segment = shared_memory.SharedMemory(name=name)
+    # Python's resource tracker would unlink the segment when this process
+    # exits, pulling it out from under the other workers.
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+class SharedSlotTable:
+    """
+    Open-addressing table of (key -> (a, b)) entries with expiry.
+
+    Args:
+        name (str): Shared-memory segment name, identical in every worker.
+        slots (int): Capacity; lookups probe at most PROBES neighbouring slots.
+    """
+
+    def __init__(self, name: str, slots: int):
+        self.slots = slots
+        self._segment = _attach(name, slots * SLOT_SIZE)
+        self._buf = self._segment.buf
+        if self._segment.size < slots * SLOT_SIZE:
+            raise ValueError(f"Shared memory segment {name!r} is smaller than requested")
+
+    @property
+    def nbytes(self) -> int:
+        return self.slots * SLOT_SIZE
+
+    def _read(self, offset: int):
+        for _ in range(4):
+            (seq,) = _SEQ.unpack_from(self._buf, offset)
+            if seq & 1:
+                continue
+            body = _BODY.unpack_from(self._buf, offset + _SEQ.size)
+            if _SEQ.unpack_from(self._buf, offset)[0] == seq:
+                return seq, body
+        return None, None
+
+    def _write(self, offset: int, key: int, a: float, b: float, expires: float):
+        (seq,) = _SEQ.unpack_from(self._buf, offset)
+        seq |= 1
+        _SEQ.pack_into(self._buf, offset, seq)
+        _BODY.pack_into(self._buf, offset + _SEQ.size, key, a, b, expires)
+        _SEQ.pack_into(self._buf, offset, seq + 1)
+
+    def _offsets(self, key: int):
+        start = key % self.slots
+        for i in range(PROBES):
+            yield ((start + i) % self.slots) * SLOT_SIZE
+
+    def get(self, key: int, now: float | None = None) -> tuple[float, float] | None:
+        """Return (a, b) for key, or None if absent or expired."""
+        now = time.time() if now is None else now
+        for offset in self._offsets(key):
+            seq, body = self._read(offset)
+            if body is None:
+                return None
+            slot_key, a, b, expires = body
+            if slot_key == key:
+                return (a, b) if expires > now else None
+            if slot_key == 0:
+                return None
+        return None
+
+    def put(self, key: int, a: float, b: float = 0.0, expires: float = float("inf"), now: float | None = None):
+        """Insert or overwrite key, evicting the soonest-expiring neighbour if needed."""
+        now = time.time() if now is None else now
+        victim, victim_expires = None, float("inf")
+        for offset in self._offsets(key):
+            seq, body = self._read(offset)
+            slot_key, slot_expires = (body[0], body[3]) if body else (None, 0.0)
+            if slot_key == key or slot_key == 0:
+                victim = offset
+                break
+            if slot_expires < victim_expires:
+                victim, victim_expires = offset, slot_expires
+        self._write(victim, key, a, b, expires)
+
+    def delete(self, key: int):
+        """Expire key in place; the slot keeps its key so probe chains stay intact."""
+        for offset in self._offsets(key):
+            seq, body = self._read(offset)
+            if body is None or body[0] == 0:
+                return
+            if body[0] == key:
+                self._write(offset, key, 0.0, 0.0, 0.0)
+                return
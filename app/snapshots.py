@@ -0,0 +1,136 @@
+"""
+Daily balance snapshot compaction.
+
+Folds each closed UTC day of journal entries into `balance_snapshots`: one
+row per account that had activity that day, holding its closing balance.
+`crud.get_balance_as_of` then starts from the nearest snapshot and replays
+at most a day of entries. The job is incremental and resumable: progress
+is kept in `job_checkpoints`, and each chunk of days is committed together
+with its checkpoint, so a crash never double-counts a day.
+
+A day is only compacted once it ended more than SNAPSHOT_COMPACT_LAG_SECONDS
+ago. Entries are stamped when their transaction starts, not when it
+commits, so a write stamped just before midnight can commit just after; the
+lag lets it land before its day is sealed. Keep it above the longest
+transaction (and above any EOD run, which posts at 00:00 of the following
+day; see `eod`).
+
+Run it once a day, at least the lag after midnight UTC (e.g. from cron):
+
+    python -m app.snapshots
+    python -m app.snapshots --until 2025-06-30
+
+Configuration (environment):
+    SNAPSHOT_COMPACT_LAG_SECONDS  grace period after a day ends before it is
+                                  compacted (default 3600).
+"""
+
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+
+CHECKPOINT = "balance_snapshots"
+CHUNK_DAYS = 31
+COMPACT_LAG = timedelta(seconds=float(os.getenv("SNAPSHOT_COMPACT_LAG_SECONDS", "3600")))
+
+
+def last_closed_day(now: datetime | None = None) -> date:
+    """The latest day that ended at least COMPACT_LAG before `now` (UTC)."""
+    return ((now or datetime.utcnow()) - COMPACT_LAG).date() - timedelta(days=1)
+
+
+def _as_date(value) -> date:
+    # func.date() returns a date on Postgres and an ISO string on SQLite.
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _previous_closing(db: Session, account_ids: list[int], day: date) -> dict[int, int]:
+    """Latest snapshot before `day` for each of the given accounts."""
+    s = models.BalanceSnapshot
+    latest = (
+        select(s.account_id, func.max(s.day).label("day"))
+        .where(s.account_id.in_(account_ids), s.day < day)
+        .group_by(s.account_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(s.account_id, s.balance_minor)
+        .where(tuple_(s.account_id, s.day).in_(select(latest.c.account_id, latest.c.day)))
+    ).all()
+    return dict(rows)
+
+
+def compact(db: Session, until: date | None = None) -> dict:
+    """
+    Write snapshots for every day after the checkpoint up to `until`.
+
+    Args:
+        db (Session): Database session.
+        until (date | None): Last day to compact; defaults to, and is
+            capped at, `last_closed_day()`.
+
+    Returns:
+        dict: Days compacted, snapshot rows written and the new checkpoint.
+    """
+    until = min(until or date.max, last_closed_day())
+    e = models.JournalEntry
+    done = crud.get_checkpoint(db, CHECKPOINT)
+    if done is not None:
+        day = date.fromisoformat(done) + timedelta(days=1)
+    else:
+        first = db.execute(select(func.min(e.created_at)).where(e.account_id.is_not(None))).scalar()
+        if first is None:
+            return {"days": 0, "snapshots": 0, "checkpoint": None}
+        day = first.date()
+
+    closing: dict[int, int] = {}
+    days = snapshots = 0
+    while day <= until:
+        last = min(day + timedelta(days=CHUNK_DAYS - 1), until)
+        bucket = func.date(e.created_at)
+        rows = db.execute(
+            select(bucket, e.account_id, func.sum(e.amount_minor))
+            .where(
+                e.account_id.is_not(None),
+                e.created_at >= datetime.combine(day, datetime.min.time()),
+                e.created_at < datetime.combine(last + timedelta(days=1), datetime.min.time()),
+            )
+            .group_by(bucket, e.account_id)
+            .order_by(bucket, e.account_id)
+        ).all()
+
+        unseen = sorted({account_id for _, account_id, _ in rows} - closing.keys())
+        if unseen:
+            closing.update({account_id: 0 for account_id in unseen})
+            closing.update(_previous_closing(db, unseen, day))
+        batch = []
+        for bucket_day, account_id, delta in rows:
+            closing[account_id] += delta
+            batch.append({"account_id": account_id, "day": _as_date(bucket_day), "balance_minor": closing[account_id]})
+        if batch:
+            db.execute(insert(models.BalanceSnapshot.__table__), batch)
+        crud.set_checkpoint(db, CHECKPOINT, last.isoformat())
+        db.commit()
+
+        days += (last - day).days + 1
+        snapshots += len(batch)
+        day = last + timedelta(days=1)
+    return {"days": days, "snapshots": snapshots, "checkpoint": crud.get_checkpoint(db, CHECKPOINT)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--until", type=date.fromisoformat, help="Last day to compact (default: the last day closed for the lag, UTC)")
+    args = parser.parse_args()
+    with SessionLocal() as db:
+        print(compact(db, args.until))
+
+
+if __name__ == "__main__":
+    main()
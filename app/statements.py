@@ -0,0 +1,93 @@
+"""
+Encoders for streamed account statements.
+
+A statement is written as a header, then one encoded chunk per batch of rows
+read from the database, then a trailer, so memory use is bounded by the
+batch size rather than by the length of the history. Output can be gzipped
+on the fly.
+
+Rows come from the journal (see `crud.statement_query`): amounts are signed,
+positive for money in and negative for money out.
+"""
+
+import csv
+import io
+import json
+import zlib
+from enum import Enum
+
+from .crud import MINOR_UNITS
+
+COLUMNS = ("id", "timestamp", "type", "amount")
+
+
+class StatementFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+MEDIA_TYPES = {
+    StatementFormat.CSV: "text/csv",
+    StatementFormat.NDJSON: "application/x-ndjson",
+}
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows a gzipped response.
+
+    An explicit ``gzip`` entry decides; otherwise ``*`` does. Either is
+    refused by ``q=0`` (or an unparseable q-value).
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            qualities[coding.lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+class StatementEncoder:
+    """
+    Turns batches of (id, timestamp, type, amount_minor) rows into response bytes.
+
+    Args:
+        format (StatementFormat): CSV (with a header row) or NDJSON.
+        gzip (bool): Compress the output as one gzip stream.
+    """
+
+    def __init__(self, format: StatementFormat, gzip: bool = False):
+        self.format = format
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    def _emit(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) if self._compressor else data
+
+    def start(self) -> bytes:
+        if self.format == StatementFormat.CSV:
+            return self._emit((",".join(COLUMNS) + "\r\n").encode())
+        return b""
+
+    def rows(self, rows) -> bytes:
+        if self.format == StatementFormat.CSV:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows((r[0], r[1].isoformat(), r[2], r[3] / MINOR_UNITS) for r in rows)
+            data = buffer.getvalue()
+        else:
+            data = "".join(
+                json.dumps({"id": r[0], "timestamp": r[1].isoformat(), "type": r[2], "amount": r[3] / MINOR_UNITS}) + "\n"
+                for r in rows
+            )
+        return self._emit(data.encode())
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b""
@@ -0,0 +1,266 @@
+"""
+Per-account velocity limits on money leaving an account.
+
+Withdrawals and outgoing transfers (debits) are checked against sliding
+windows, e.g. at most 10 debits per minute and at most 5000 debited per
+24 hours. `crud.create_transaction`, `crud.transfer_funds` and
+`crud.create_transactions_batch` reject a debit that would go over a limit
+with a ValueError (400).
+
+Usage is tracked in process memory, not summed from the journal on every
+write. Each account has a ring of VELOCITY_BUCKETS time buckets per limit,
+plus a running total. A check advances the ring to the current bucket and
+compares one integer, so it takes microseconds. The window is counted in
+whole buckets and covers up to one bucket more than the limit's window,
+so the error is always on the strict side.
+
+A check that passes reserves the debit in the same locked step, so
+concurrent debits in this process see it at once and cannot both slip
+under a limit. The caller releases the reservation if the debit does not
+commit; a committed debit keeps it.
+
+An account's rings are built from its journal entries in the longest
+window the first time it is checked. After VELOCITY_TTL_SECONDS they are
+rebuilt, which picks up debits committed by other workers. Across workers
+a limit can therefore be exceeded by what the others committed since the
+last rebuild. At most VELOCITY_MAX_ACCOUNTS accounts are kept, evicting the
+least recently checked. Entries, memory and rejections are on /metrics.
+
+Configuration (environment):
+    VELOCITY_LIMITS        limits separated by ";", each ``count N/SECONDS``
+                           (debits) or ``amount X/SECONDS`` (currency units),
+                           e.g. ``count 10/60; amount 5000/86400``. Empty
+                           (the default) turns the checks off.
+    VELOCITY_BUCKETS       buckets per window (default 60).
+    VELOCITY_MAX_ACCOUNTS  accounts kept in memory (default 10000).
+    VELOCITY_TTL_SECONDS   how long an account's rings are trusted before
+                           they are rebuilt from the journal (default 60).
+"""
+
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+
+VELOCITY_LIMITS = os.getenv("VELOCITY_LIMITS", "")
+VELOCITY_BUCKETS = int(os.getenv("VELOCITY_BUCKETS", "60"))
+VELOCITY_MAX_ACCOUNTS = int(os.getenv("VELOCITY_MAX_ACCOUNTS", "10000"))
+VELOCITY_TTL_SECONDS = float(os.getenv("VELOCITY_TTL_SECONDS", "60"))
+
+# Journal entry kinds that count as debits.
+DEBIT_KINDS = ("withdraw", "transfer_out")
+MINOR_UNITS = models.MINOR_UNITS
+
+
+class Limit(NamedTuple):
+    """At most `limit` debits (count) or minor units debited (amount) per `window` seconds."""
+    metric: str
+    limit: int
+    window: float
+
+    def describe(self) -> str:
+        if self.metric == "count":
+            return f"at most {self.limit} withdrawals or transfers per {self.window:g}s"
+        return f"at most {self.limit / MINOR_UNITS:.2f} withdrawn or transferred per {self.window:g}s"
+
+
+def parse_limits(spec: str) -> list[Limit]:
+    """
+    Parse VELOCITY_LIMITS.
+
+    Raises:
+        ValueError: If a limit is malformed.
+    """
+    limits = []
+    for text in filter(None, (part.strip() for part in spec.split(";"))):
+        fields = text.split()
+        value, _, seconds = fields[-1].partition("/") if len(fields) == 2 else ("", "", "")
+        if len(fields) != 2 or fields[0] not in ("count", "amount") or not seconds:
+            raise ValueError(f"Bad velocity limit {text!r}: expected 'count N/SECONDS' or 'amount X/SECONDS'")
+        limit = int(value) if fields[0] == "count" else round(float(value) * MINOR_UNITS)
+        if limit < 0 or float(seconds) <= 0:
+            raise ValueError(f"Bad velocity limit {text!r}: limit and window must be positive")
+        limits.append(Limit(fields[0], limit, float(seconds)))
+    return limits
+
+
+class Reservation(NamedTuple):
+    """A debit counted by `VelocityTracker.check`, until it is released."""
+    account_id: int
+    rings: "_Rings"
+    at: float
+    minor: int
+
+
+class _Rings:
+    """
+    One account's usage: per limit, a ring of bucket sums and their running total.
+
+    ``heads[i]`` is the absolute index (time // width) of limit i's newest
+    bucket; the ring holds it and the `size - 1` buckets before it.
+    """
+
+    __slots__ = ("heads", "rings", "totals", "loaded_at")
+
+    def __init__(self, count: int, size: int, loaded_at: float):
+        self.heads = [0] * count
+        self.rings = [array("q", bytes(8 * size)) for _ in range(count)]
+        self.totals = [0] * count
+        self.loaded_at = loaded_at
+
+    def advance(self, i: int, head: int):
+        ring = self.rings[i]
+        size = len(ring)
+        if head - self.heads[i] >= size:
+            ring[:] = array("q", bytes(8 * size))
+            self.totals[i] = 0
+        else:
+            for index in range(self.heads[i] + 1, head + 1):
+                self.totals[i] -= ring[index % size]
+                ring[index % size] = 0
+        self.heads[i] = max(self.heads[i], head)
+
+    def add(self, i: int, index: int, value: int):
+        if index > self.heads[i]:
+            self.advance(i, index)
+        elif index <= self.heads[i] - len(self.rings[i]):
+            return  # older than the ring
+        self.rings[i][index % len(self.rings[i])] += value
+        self.totals[i] += value
+
+
+class VelocityTracker:
+    """
+    Sliding-window debit usage per account, kept for the most recently checked accounts.
+
+    Args:
+        limits (list[Limit]): Limits to enforce; none disables every check.
+        buckets (int): Buckets per window.
+        max_accounts (int): Accounts kept before the least recently checked is evicted.
+        ttl (float): Seconds before an account's rings are rebuilt from the journal.
+    """
+
+    def __init__(self, limits: list[Limit], buckets: int = VELOCITY_BUCKETS,
+                 max_accounts: int = VELOCITY_MAX_ACCOUNTS, ttl: float = VELOCITY_TTL_SECONDS):
+        self.limits = limits
+        self.widths = [limit.window / buckets for limit in limits]
+        self.size = buckets + 1  # one extra so the window is always fully covered
+        self.max_accounts = max_accounts
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = self.rejections = 0
+        self._accounts: OrderedDict[int, _Rings] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def entry_bytes(self) -> int:
+        """Approximate memory held per tracked account."""
+        rings = _Rings(len(self.limits), self.size, 0.0)
+        return (sys.getsizeof(rings) + sum(sys.getsizeof(ring) for ring in rings.rings)
+                + sys.getsizeof(rings.heads) + sys.getsizeof(rings.totals) + sys.getsizeof(rings.rings))
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def _load(self, db: Session, account_id: int, now: float) -> _Rings:
+        """Build an account's rings from its debits in the longest window."""
+        rings = _Rings(len(self.limits), self.size, now)
+        for i, width in enumerate(self.widths):
+            rings.heads[i] = int(now // width)
+        since = datetime.utcfromtimestamp(now) - timedelta(seconds=max(limit.window for limit in self.limits)
+                                                           + max(self.widths))
+        e = models.JournalEntry
+        rows = db.execute(
+            select(e.created_at, e.amount_minor)
+            .where(e.account_id == account_id, e.created_at >= since, e.kind.in_(DEBIT_KINDS))
+        ).all()
+        for created_at, amount_minor in rows:
+            at = created_at.replace(tzinfo=timezone.utc).timestamp()
+            for i, limit in enumerate(self.limits):
+                rings.add(i, int(at // self.widths[i]), 1 if limit.metric == "count" else -amount_minor)
+        return rings
+
+    def check(self, db: Session, account_id: int, minor: int) -> Reservation | None:
+        """
+        Reserve a debit of `minor` from an account, or raise if it would exceed a limit.
+
+        The limits are checked and the debit counted under one lock. Release
+        the reservation if the debit is not committed.
+
+        Args:
+            db (Session): Database session, used only to load an account
+                that is not tracked yet (or whose rings are stale).
+            account_id (int): Account being debited.
+            minor (int): Amount of the debit in minor units.
+
+        Raises:
+            ValueError: If the debit would exceed a velocity limit.
+
+        Returns:
+            Reservation | None: The reserved debit (None with no limits).
+        """
+        if not self.limits:
+            return None
+        now = time.time()
+        with self._lock:
+            rings = self._accounts.get(account_id)
+            if rings is not None and rings.loaded_at > now - self.ttl:
+                self._accounts.move_to_end(account_id)
+                self.hits += 1
+            else:
+                rings = None
+                self.misses += 1
+        if rings is None:
+            loaded = self._load(db, account_id, now)
+            with self._lock:
+                # Another thread may have loaded (and reserved on) the account meanwhile.
+                rings = self._accounts.get(account_id)
+                if rings is None or rings.loaded_at <= now - self.ttl:
+                    rings = self._accounts[account_id] = loaded
+                self._accounts.move_to_end(account_id)
+                while len(self._accounts) > self.max_accounts:
+                    self._accounts.popitem(last=False)
+                    self.evictions += 1
+
+        with self._lock:
+            for i, limit in enumerate(self.limits):
+                rings.advance(i, int(now // self.widths[i]))
+                used = rings.totals[i] + (1 if limit.metric == "count" else minor)
+                if used > limit.limit:
+                    self.rejections += 1
+                    raise ValueError(f"Velocity limit exceeded: {limit.describe()}")
+            for i, limit in enumerate(self.limits):
+                rings.add(i, int(now // self.widths[i]), 1 if limit.metric == "count" else minor)
+        return Reservation(account_id, rings, now, minor)
+
+    def release(self, reservation: Reservation | None):
+        """
+        Give back a reserved debit that was not committed.
+
+        Nothing is given back once the account's rings were rebuilt from the
+        journal (which only holds committed debits) or the reserved bucket
+        left the window.
+        """
+        if reservation is None:
+            return
+        with self._lock:
+            if self._accounts.get(reservation.account_id) is not reservation.rings:
+                return
+            for i, limit in enumerate(self.limits):
+                reservation.rings.add(i, int(reservation.at // self.widths[i]),
+                                      -1 if limit.metric == "count" else -reservation.minor)
+
+    def clear(self):
+        with self._lock:
+            self._accounts.clear()
+
+
+tracker = VelocityTracker(parse_limits(VELOCITY_LIMITS))
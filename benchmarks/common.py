@@ -0,0 +1,109 @@
+"""
+Shared helpers for the LiteBank benchmarks: database setup and latency stats.
+"""
+
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Seeded users all share this password; see benchmarks.seed.
+PASSWORD = "password123"
+
+
+def email_for(n: int) -> str:
+    """Email address of the n-th seeded user."""
+    return f"user{n}@bench.litebank"
+
+
+def default_sqlite_url() -> str:
+    """Return a URL for a throwaway SQLite file in the temp directory."""
+    path = os.path.join(tempfile.mkdtemp(prefix="litebank-bench-"), "bench.db")
+    return f"sqlite:///{path}"
+
+
+def make_sessionmaker(url: str, pool_size: int = 32):
+    """
+    Build an engine and session factory for a benchmark, creating the schema.
+
+    Args:
+        url (str): SQLAlchemy database URL.
+        pool_size (int): Connections to keep, at least one per worker thread.
+
+    Returns:
+        tuple[Engine, sessionmaker]: The engine and its session factory.
+    """
+    # Imported here so callers can point DATABASE_URL elsewhere first.
+    from app.database import Base
+    from app import models  # noqa: F401  (registers tables on Base.metadata)
+
+    kwargs = {"pool_size": pool_size, "max_overflow": 0}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False, "timeout": 30}
+    engine = create_engine(url, **kwargs)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples (0 for an empty list)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(samples: list[float]) -> dict[str, float]:
+    """Summarize latencies in seconds as p50/p95/p99/max in milliseconds."""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples, default=0.0) * 1000, 3),
+    }
+
+
+@contextmanager
+def serve(env: dict[str, str], port: int = 8765, workers: int = 1):
+    """
+    Run the API under uvicorn in a subprocess for over-HTTP benchmarks.
+
+    Args:
+        env (dict[str, str]): Extra environment variables (e.g. DATABASE_URL).
+        port (int): Port to listen on.
+        workers (int): uvicorn worker processes.
+
+    Yields:
+        str: The server's base URL, once /healthz answers.
+    """
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(cmd, cwd=root, env={**os.environ, "RATE_LIMITS": "", **env})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{base_url}/healthz").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("API server failed to start")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
@@ -0,0 +1,57 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+A scenario regresses when its throughput drops, or its p95/p99 latency or
+queries per request rise, by more than --threshold (default 10%). Exits
+with status 1 if anything regressed, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/head.json
+"""
+
+import argparse
+import json
+
+# metric -> True if bigger is better
+METRICS = {"throughput_rps": True, "p95_ms": False, "p99_ms": False, "queries_per_request": False}
+
+
+def compare(base: dict, head: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, new in head["scenarios"].items():
+        old = base["scenarios"].get(name)
+        if old is None:
+            continue
+        cells = []
+        for metric, higher_is_better in METRICS.items():
+            before, after = old.get(metric), new.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > threshold else ""
+            if flag:
+                regressions.append(f"{name}.{metric}")
+            cells.append(f"{metric} {before:g} -> {after:g} ({change:+.1%}){flag}")
+        print(f"{name:20s} " + "  ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    regressions = compare(base, head, args.threshold)
+    if regressions:
+        print(f"regressions: {', '.join(regressions)}")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
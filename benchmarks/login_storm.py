@@ -0,0 +1,82 @@
+"""
+Login storm benchmark: bcrypt on the request thread pool vs. the hashing pool.
+
+Starts the API twice, once with HASH_POOL_SIZE=0 (bcrypt on the event
+loop's default thread pool) and once with a process pool. Each run fires
+concurrent logins while a prober hits /healthz. It reports login latency
+and how much the storm slows an unrelated endpoint down.
+
+Usage:
+    python -m benchmarks.login_storm --concurrency 64 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from app import crud, models
+from .common import default_sqlite_url, latency_summary, make_sessionmaker, serve
+
+EMAIL, PASSWORD = "storm@example.com", "password123"
+
+
+async def storm(base_url: str, concurrency: int, duration: float) -> dict:
+    logins, probes, rejected = [], [], 0
+    deadline = time.perf_counter() + duration
+
+    async def login_loop(client):
+        nonlocal rejected
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            r = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            if r.status_code == 503:
+                rejected += 1
+            else:
+                logins.append(time.perf_counter() - started)
+
+    async def probe_loop(client):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await client.get("/healthz")
+            probes.append(time.perf_counter() - started)
+            await asyncio.sleep(0.01)
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await asyncio.gather(probe_loop(client), *(login_loop(client) for _ in range(concurrency)))
+    return {
+        "logins_per_sec": round(len(logins) / duration, 1),
+        "rejected_503": rejected,
+        "login": latency_summary(logins),
+        "healthz": latency_summary(probes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--pool-size", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS for the run")
+    args = parser.parse_args()
+
+    url = default_sqlite_url()
+    engine, Session = make_sessionmaker(url)
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    with Session() as db:
+        db.add(models.User(name="storm", email=EMAIL, password_hash=crud.get_password_hash(PASSWORD)))
+        db.commit()
+    engine.dispose()
+
+    for label, pool_size in (("thread pool", 0), ("process pool", args.pool_size)):
+        env = {"DATABASE_URL": url, "HASH_POOL_SIZE": str(pool_size), "BCRYPT_ROUNDS": str(args.rounds)}
+        with serve(env) as base_url:
+            result = asyncio.run(storm(base_url, args.concurrency, args.duration))
+        print(f"{label} (HASH_POOL_SIZE={pool_size}): {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Serialization cost of the list endpoints per 10k rows: ORM + pydantic vs. columns + orjson.
+
+Seeds one user with --rows accounts and --rows transactions, then times
+building the response body of `GET /accounts/` and a --rows-sized page of
+`GET /transactions/` two ways:
+
+- before: ORM instances (accounts) or row dicts (transactions) validated
+  through the pydantic response models, then `jsonable_encoder` and
+  `JSONResponse`, as FastAPI does for a `response_model`;
+- after: the column-only rows from `crud` rendered with `ORJSONResponse`.
+
+Both bodies are checked to decode to the same JSON.
+
+Usage:
+    python -m benchmarks.serialization --rows 10000
+"""
+
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from .common import default_sqlite_url, latency_summary
+from .seed import seed
+
+
+def accounts_before(db) -> bytes:
+    accounts = db.query(models.Account).filter(models.Account.user_id == 1).all()
+    return JSONResponse(jsonable_encoder([schemas.Account.from_orm(a) for a in accounts])).body
+
+
+def accounts_after(db) -> bytes:
+    return ORJSONResponse(crud.get_accounts(db, user_id=1)).body
+
+
+def transactions_before(db, rows: int) -> bytes:
+    page = crud.get_transactions(db, user_id=1, limit=rows)
+    return JSONResponse(jsonable_encoder(schemas.TransactionPage(**page))).body
+
+
+def transactions_after(db, rows: int) -> bytes:
+    return ORJSONResponse(crud.get_transactions(db, user_id=1, limit=rows)).body
+
+
+def measure(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Database URL; defaults to a temp SQLite file")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    url = args.url or default_sqlite_url()
+    seed(url, users=1, accounts_per_user=args.rows, transactions=args.rows, days=30)
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as db:
+        cases = {
+            "accounts": (lambda: accounts_before(db), lambda: accounts_after(db)),
+            "transactions": (lambda: transactions_before(db, args.rows), lambda: transactions_after(db, args.rows)),
+        }
+        for name, (before, after) in cases.items():
+            assert json.loads(before()) == json.loads(after()), f"{name}: bodies differ"
+            print({"endpoint": name, "rows": args.rows,
+                   "before": measure(before, args.repeat), "after": measure(after, args.repeat)})
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()